@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+from collections import Counter, OrderedDict
 from dataclasses import asdict, dataclass, field as dc_field, fields as dataclass_fields, is_dataclass, replace
+from functools import lru_cache
 import json
+import logging
 import os
 import re
-import threading
 import tempfile
+import threading
 import time
 from pathlib import Path
 from typing import Any, Callable
@@ -101,6 +104,7 @@ from app.core.kernel_debug_support import (
 )
 from app.execution_policy import execution_policy_spec, planner_enabled_for_policy
 from app.evolution import EvolutionStore
+from app.json_codec import dumps_json
 from app.models import AgentPanel, ChatSettings, ToolEvent
 from app.openai_auth import OpenAIAuthManager, normalize_model_for_auth_mode
 from app.pipeline_hooks import (
@@ -440,6 +444,112 @@ _INITIAL_CONTENT_TRIAGE_HINTS = (
     "can you make sense",
 )
 
+_RUNNER_CACHE_MAX_ENTRIES = 8
+
+logger = logging.getLogger(__name__)
+
+# Replacement body for pruned tool results. It is identical for every pruned message so a
+# pruned prefix stays byte-stable across loop iterations (provider prompt caches key on it).
+_PRUNED_TOOL_RESULT_CONTENT = json.dumps(
+    {
+        "trimmed": "history_pruned",
+        "note": "Older tool result pruned to control context growth.",
+    },
+    ensure_ascii=False,
+)
+
+_FAILOVER_ERROR_HINTS = (
+    "429",
+    "rate limit",
+    "rate_limit",
+    "timeout",
+    "timed out",
+    "temporarily unavailable",
+    "service unavailable",
+    "overloaded",
+    "connection reset",
+    "connection aborted",
+    "connection error",
+    "502",
+    "503",
+    "504",
+    "quota",
+    "insufficient",
+    "authentication",
+    "unauthorized",
+    "forbidden",
+    "401",
+    "403",
+)
+# One alternation scans the error text once instead of once per hint.
+_FAILOVER_ERROR_RE = re.compile("|".join(map(re.escape, _FAILOVER_ERROR_HINTS)))
+_METHOD_NOT_ALLOWED_RE = re.compile(r"405|method not allowed")
+
+# Endpoint paths accepted in OPENAI_BASE_URL. A "/v1/..." form keeps its "/v1" prefix once the
+# endpoint part is stripped, so the bare suffixes cover both spellings.
+_ENDPOINT_PATH_SUFFIXES = ("/chat/completions", "/responses")
+
+_ATTACHMENT_SIZE_CACHE_MAX_ENTRIES = 512
+_ZIP_ATTACHMENT_HINT = "该文件是 ZIP，若需要解压可调用 extract_zip(zip_path=该路径, dst_dir=目标目录)。\n"
+_MSG_ATTACHMENT_HINT = (
+    "该文件是 MSG 邮件；若需读取其中附件（如 xlsx/png），先调用 "
+    "extract_msg_attachments(msg_path=该路径, dst_dir=目标目录)。"
+    "当用户说“完整/全部解释邮件”时，必须执行该步骤，不要跳过。\n"
+)
+
+
+@lru_cache(maxsize=256)
+def _format_byte_size(size: float) -> str:
+    if size <= 0:
+        return "0 B"
+    units = ("B", "KiB", "MiB", "GiB", "TiB")
+    idx = 0
+    while size >= 1024 and idx < len(units) - 1:
+        size /= 1024.0
+        idx += 1
+    if idx == 0:
+        return f"{int(size)} {units[idx]}"
+    return f"{size:.2f} {units[idx]}"
+
+
+_TEXT_CONTENT_PART_TYPES = frozenset({"text", "output_text", "input_text"})
+
+
+def _content_part_text(item: Any) -> str | None:
+    if isinstance(item, str):
+        return item
+    if not isinstance(item, dict):
+        return str(item)
+    if item.get("type") in _TEXT_CONTENT_PART_TYPES:
+        text = item.get("text")
+        if isinstance(text, str) and text:
+            return text
+    return None
+
+
+def _first_int(mapping: dict[str, Any], *keys: str) -> int:
+    # First truthy value among `keys`, as an int; providers report counts as ints, so that check comes first.
+    for key in keys:
+        value = mapping.get(key)
+        if not value:
+            continue
+        if type(value) is int:
+            return value
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return 0
+
+
+@dataclass(slots=True, frozen=True)
+class ModelFailoverState:
+    failures: int = 0
+    cooldown_until: float = 0.0
+    last_used_at: float = 0.0
+    last_failed_at: float = 0.0
+
+
 @dataclass
 class ExecutionState:
     task_type: str = "standard"
@@ -598,7 +708,156 @@ class ReadSessionHistoryArgs(BaseModel):
     max_turns: int = Field(default=80, ge=1, le=800)
 
 
+# (name, description, args_schema, OfficeAgent method) for each LangChain tool.
+_LANGCHAIN_TOOL_SPECS: tuple[tuple[str, str, type[BaseModel], str], ...] = (
+    (
+        "run_shell",
+        "Run a safe shell command in workspace. Supports simple commands without pipes.",
+        RunShellArgs,
+        "_run_shell_tool",
+    ),
+    (
+        "list_directory",
+        "List files in a workspace directory.",
+        ListDirectoryArgs,
+        "_list_directory_tool",
+    ),
+    (
+        "read_text_file",
+        (
+            "Read a local text/document file. Auto extracts text from PDF/DOCX/MSG/XLSX. "
+            "Supports chunked reads with start_char, and optional line-mode reads with start_line/max_lines. "
+            "For complete reading use max_chars up to 1000000 and continue while has_more=true."
+        ),
+        ReadTextFileArgs,
+        "_read_text_file_tool",
+    ),
+    (
+        "search_text_in_file",
+        (
+            "Search within a local text/document file and return matching evidence snippets. "
+            "Use this first for specs/protocols/command codes; it expands hex variants like 15h/15 h/0x15."
+        ),
+        SearchTextInFileArgs,
+        "_search_text_in_file_tool",
+    ),
+    (
+        "multi_query_search",
+        "Run multiple file-search queries against one file and merge the matching evidence snippets.",
+        MultiQuerySearchArgs,
+        "_multi_query_search_tool",
+    ),
+    (
+        "doc_index_build",
+        "Build or inspect a cached PDF document index, including headings and cache status.",
+        DocIndexBuildArgs,
+        "_doc_index_build_tool",
+    ),
+    (
+        "read_section_by_heading",
+        "Read a document section by matching a heading or section number.",
+        ReadSectionByHeadingArgs,
+        "_read_section_by_heading_tool",
+    ),
+    (
+        "table_extract",
+        "Extract tables from a PDF/XLSX file, optionally narrowed by query or page hint.",
+        TableExtractArgs,
+        "_table_extract_tool",
+    ),
+    (
+        "fact_check_file",
+        "Check whether a file contains evidence that supports or conflicts with a claim.",
+        FactCheckFileArgs,
+        "_fact_check_file_tool",
+    ),
+    (
+        "search_codebase",
+        (
+            "Search code/text files under a local root and return file, line, and excerpt matches. "
+            "If root is omitted, it defaults to '.' (the current workspace root)."
+        ),
+        SearchCodebaseArgs,
+        "_search_codebase_tool",
+    ),
+    (
+        "copy_file",
+        "Copy a file (binary-safe) from src_path to dst_path in allowed roots.",
+        CopyFileArgs,
+        "_copy_file_tool",
+    ),
+    (
+        "extract_zip",
+        "Extract a local .zip archive into a target directory (safe, with limits).",
+        ExtractZipArgs,
+        "_extract_zip_tool",
+    ),
+    (
+        "extract_msg_attachments",
+        (
+            "Extract attachments from a local .msg email into a target directory, "
+            "then continue reading those files."
+        ),
+        ExtractMsgAttachmentsArgs,
+        "_extract_msg_attachments_tool",
+    ),
+    (
+        "write_text_file",
+        "Create or overwrite a UTF-8 text file in workspace.",
+        WriteTextFileArgs,
+        "_write_text_file_tool",
+    ),
+    (
+        "append_text_file",
+        "Append UTF-8 text to a file (or create if missing) in workspace.",
+        AppendTextFileArgs,
+        "_append_text_file_tool",
+    ),
+    (
+        "replace_in_file",
+        "Replace target text in a UTF-8 text file in workspace.",
+        ReplaceInFileArgs,
+        "_replace_in_file_tool",
+    ),
+    (
+        "fetch_web",
+        "Fetch web content from a URL for information lookup.",
+        FetchWebArgs,
+        "_fetch_web_tool",
+    ),
+    (
+        "download_web_file",
+        "Download and save a web file (binary-safe), e.g. PDF/ZIP/images.",
+        DownloadWebFileArgs,
+        "_download_web_file_tool",
+    ),
+    (
+        "search_web",
+        "Search web by query and return candidate URLs/snippets before fetch_web.",
+        SearchWebArgs,
+        "_search_web_tool",
+    ),
+)
+
+_SESSION_LANGCHAIN_TOOL_SPECS: tuple[tuple[str, str, type[BaseModel], str], ...] = (
+    (
+        "list_sessions",
+        "List recent local chat sessions for cross-session context lookup.",
+        ListSessionsArgs,
+        "_list_sessions_tool",
+    ),
+    (
+        "read_session_history",
+        "Read one local chat session history by session_id.",
+        ReadSessionHistoryArgs,
+        "_read_session_history_tool",
+    ),
+)
+
+
 class OfficeAgent:
+    _lc_tool_templates: dict[tuple[Any, bool], tuple[Any, ...]] = {}
+
     def __init__(self, config: AppConfig, *, kernel_runtime: KernelRuntime | None = None) -> None:
         self.config = config
         self._capability_runtime: AgentCapabilityRuntime = build_agent_capability_runtime(
@@ -648,8 +907,16 @@ class OfficeAgent:
         self._lc_tool_map = {getattr(tool, "name", ""): tool for tool in self._lc_tools}
         self._role_registry = self._capability_runtime.role_registry
         self._role_runtime_controller = self._capability_runtime.runtime_controller
-        self._model_failover_lock = threading.Lock()
-        self._model_failover_state: dict[str, dict[str, int | float]] = {}
+        self._openai_base_url = self._normalize_base_url(config.openai_base_url) if config.openai_base_url else ""
+        self._attachment_size_cache: dict[str, int] = {}
+        self._runner_cache_lock = threading.Lock()
+        self._runner_cache: OrderedDict[tuple[Any, ...], tuple[Any, str]] = OrderedDict()
+        self._runner_cache_registry: Any = None
+        # Readers take no lock: each entry is an immutable snapshot swapped in whole. Writers only
+        # serialize per model, via locks allocated lazily under _model_locks_guard.
+        self._model_failover_state: dict[str, ModelFailoverState] = {}
+        self._model_locks_guard = threading.Lock()
+        self._model_locks: dict[str, threading.Lock] = {}
 
     def _debug_openai_auth_summary(self) -> dict[str, Any]:
         return self._auth_manager.auth_summary()
@@ -1241,6 +1508,9 @@ class OfficeAgent:
     def _record_module_success(self, *, kind: str, selected_ref: str, mode: str | None = None) -> None:
         self._kernel_runtime.record_module_success(kind=kind, selected_ref=selected_ref, mode=mode)
 
+    def openai_base_url(self) -> str:
+        return self._openai_base_url
+
     def _ensure_openai_ca_env(self, ca_cert_path: str) -> None:
         os.environ.setdefault("SSL_CERT_FILE", ca_cert_path)
         os.environ.setdefault("REQUESTS_CA_BUNDLE", ca_cert_path)
@@ -2374,7 +2644,7 @@ class OfficeAgent:
             synthetic: bool = False,
         ) -> None:
             nonlocal worker_citation_candidates
-            result_json = json.dumps(result, ensure_ascii=False)
+            result_json = dumps_json(result)
             if synthetic:
                 set_role_activity(
                     "coordinator",
@@ -5664,10 +5934,10 @@ class OfficeAgent:
         parsed = self._parse_tool_event_preview(event)
         if isinstance(parsed, dict) and "ok" in parsed:
             return bool(parsed.get("ok"))
-        preview = str(event.output_preview or "").lower()
-        if '"ok": true' in preview:
+        preview = str(event.output_preview or "").lower().replace('"ok": ', '"ok":')
+        if '"ok":true' in preview:
             return True
-        if '"ok": false' in preview:
+        if '"ok":false' in preview:
             return False
         return None
 
@@ -7846,6 +8116,16 @@ class OfficeAgent:
         return build_execution_plan_helper(self, attachment_metas=attachment_metas, settings=settings, route=route)
 
     def _build_llm(self, model: str, max_output_tokens: int, use_responses_api: bool | None = None):
+        return self._build_llm_with_provider_ref(model, max_output_tokens, use_responses_api)[0]
+
+    def _build_llm_with_provider_ref(
+        self,
+        model: str,
+        max_output_tokens: int,
+        use_responses_api: bool | None = None,
+    ) -> tuple[Any, str | None]:
+        # The ref is the provider module that built the runner, "" when no provider module is
+        # registered, and None when the module raised and the direct fallback was built instead.
         auth = self._auth_manager.require()
         provider_mode = str(auth.mode or "").strip().lower()
         registry = self._module_registry()
@@ -7856,6 +8136,7 @@ class OfficeAgent:
             if provider_mode == "codex_auth"
             else "provider_openai_api@1.0.0"
         )
+        built_ref: str | None = ""
         if provider is not None and hasattr(provider, "build_runner"):
             try:
                 runner = provider.build_runner(
@@ -7870,7 +8151,7 @@ class OfficeAgent:
                     selected_ref=selected_ref or fallback_ref,
                     mode=provider_mode,
                 )
-                return runner
+                return runner, selected_ref or fallback_ref
             except Exception as exc:
                 self._record_module_failure(
                     kind="provider",
@@ -7879,12 +8160,14 @@ class OfficeAgent:
                     error=str(exc),
                     mode=provider_mode,
                 )
-        return self._build_llm_direct_fallback(
+                built_ref = None
+        runner = self._build_llm_direct_fallback(
             auth=auth,
             model=model,
             max_output_tokens=max_output_tokens,
             use_responses_api=use_responses_api,
         )
+        return runner, built_ref
 
     def _build_llm_direct_fallback(
         self,
@@ -7912,8 +8195,8 @@ class OfficeAgent:
         }
         if self.config.openai_temperature is not None:
             kwargs["temperature"] = self.config.openai_temperature
-        if self.config.openai_base_url:
-            kwargs["base_url"] = self._normalize_base_url(self.config.openai_base_url)
+        if self._openai_base_url:
+            kwargs["base_url"] = self._openai_base_url
         if self.config.openai_ca_cert_path:
             self._ensure_openai_ca_env(self.config.openai_ca_cert_path)
         return self._ChatOpenAI(**kwargs)
@@ -8015,8 +8298,13 @@ class OfficeAgent:
     ) -> tuple[Any, Any, list[str]]:
         notes: list[str] = []
         auth = self._auth_manager.require(allow_refresh=False)
-        llm = self._build_llm(model=model, max_output_tokens=max_output_tokens)
-        runner = llm.bind_tools(self._select_langchain_tools(tool_names)) if enable_tools else llm
+        runner = self._get_runner(
+            auth=auth,
+            model=model,
+            max_output_tokens=max_output_tokens,
+            enable_tools=enable_tools,
+            tool_names=tool_names,
+        )
         try:
             return runner.invoke(messages), runner, notes
         except Exception as exc:
@@ -8027,14 +8315,91 @@ class OfficeAgent:
         notes.append(
             f"模型 {model} 返回 405，自动切换 use_responses_api={str(fallback_use_responses).lower()} 重试。"
         )
-        llm_fb = self._build_llm(
+        runner_fb = self._get_runner(
+            auth=auth,
             model=model,
             max_output_tokens=max_output_tokens,
+            enable_tools=enable_tools,
+            tool_names=tool_names,
             use_responses_api=fallback_use_responses,
         )
-        runner_fb = llm_fb.bind_tools(self._select_langchain_tools(tool_names)) if enable_tools else llm_fb
         return runner_fb.invoke(messages), runner_fb, notes
 
+    def _get_runner(
+        self,
+        *,
+        auth: Any,
+        model: str,
+        max_output_tokens: int,
+        enable_tools: bool,
+        tool_names: list[str] | None = None,
+        use_responses_api: bool | None = None,
+    ) -> Any:
+        # Building the LLM and binding tools converts every tool schema; reuse bound runners
+        # across turns. The key covers everything the build depends on, including credentials.
+        tools = self._select_langchain_tools(tool_names) if enable_tools else []
+        registry = self._module_registry()
+        provider_ref = ""
+        if registry is not None:
+            provider_ref = str((registry.selected_refs or {}).get(f"provider:{auth.mode}") or "")
+        key = (
+            auth.mode,
+            auth.api_key or "",
+            provider_ref,
+            model,
+            int(max_output_tokens),
+            use_responses_api,
+            enable_tools,
+            tuple(getattr(tool, "name", "") for tool in tools),
+        )
+        with self._runner_cache_lock:
+            if registry is not self._runner_cache_registry:
+                # Reloads, promotions and rollbacks swap in a new registry object.
+                self._runner_cache.clear()
+                self._runner_cache_registry = registry
+            cached = self._runner_cache.get(key)
+            if cached is not None:
+                self._runner_cache.move_to_end(key)
+        if cached is not None:
+            runner, built_ref = cached
+            if built_ref:
+                self._record_module_success(
+                    kind="provider",
+                    selected_ref=built_ref,
+                    mode=str(auth.mode or "").strip().lower(),
+                )
+            return runner
+
+        llm, built_ref = self._build_llm_with_provider_ref(
+            model=model,
+            max_output_tokens=max_output_tokens,
+            use_responses_api=use_responses_api,
+        )
+        runner = llm.bind_tools(tools) if enable_tools else llm
+        if built_ref is None:
+            # A direct fallback after a provider failure is rebuilt per call so the module is retried.
+            return runner
+        with self._runner_cache_lock:
+            if registry is self._runner_cache_registry:
+                self._runner_cache[key] = (runner, built_ref)
+                while len(self._runner_cache) > _RUNNER_CACHE_MAX_ENTRIES:
+                    self._runner_cache.popitem(last=False)
+        return runner
+
+    def prewarm_default_runner(self) -> None:
+        # Called once at server startup so requests never pay for binding the default model's tools;
+        # throwaway agents skip it.
+        try:
+            auth = self._auth_manager.require(allow_refresh=False)
+            self._get_runner(
+                auth=auth,
+                model=self._normalize_model_for_current_auth(self.config.default_model),
+                max_output_tokens=ChatSettings().max_output_tokens,
+                enable_tools=True,
+            )
+        except Exception as exc:
+            logger.warning("Default runner prewarm skipped: %s", exc)
+
     def _invoke_with_405_fallback(
         self,
         messages: list[Any],
@@ -8051,211 +8416,92 @@ class OfficeAgent:
         return response
 
     def _build_model_candidates(self, primary_model: str) -> list[str]:
-        candidates: list[str] = []
-        seen: set[str] = set()
-        for raw in [primary_model, *self.config.model_fallbacks]:
+        # Keyed by lowercased name; the first spelling of each model wins and order is preserved.
+        candidates: dict[str, str] = {}
+        for raw in (primary_model, *self.config.model_fallbacks):
             model = self._normalize_model_for_current_auth(str(raw or "").strip())
-            if not model:
-                continue
-            key = model.lower()
-            if key in seen:
-                continue
-            seen.add(key)
-            candidates.append(model)
-        return candidates
+            if model:
+                candidates.setdefault(model.lower(), model)
+        return list(candidates.values())
 
     def _normalize_model_for_current_auth(self, model: str) -> str:
         resolved = self._auth_manager.resolve()
         return normalize_model_for_auth_mode(model, resolved.mode)
 
+    def _model_lock(self, key: str) -> threading.Lock:
+        lock = self._model_locks.get(key)
+        if lock is None:
+            with self._model_locks_guard:
+                lock = self._model_locks.setdefault(key, threading.Lock())
+        return lock
+
     def _mark_model_success(self, model: str) -> None:
         key = model.strip().lower()
         if not key:
             return
-        now = time.time()
-        with self._model_failover_lock:
-            state = self._model_failover_state.setdefault(key, {})
-            state["failures"] = 0
-            state["cooldown_until"] = 0.0
-            state["last_used_at"] = now
+        with self._model_lock(key):
+            state = self._model_failover_state.get(key) or ModelFailoverState()
+            self._model_failover_state[key] = replace(
+                state,
+                failures=0,
+                cooldown_until=0.0,
+                last_used_at=time.monotonic(),
+            )
 
     def _mark_model_failure(self, model: str) -> int:
         key = model.strip().lower()
         if not key:
             return self.config.model_cooldown_base_sec
-        now = time.time()
-        with self._model_failover_lock:
-            state = self._model_failover_state.setdefault(key, {})
-            failures = int(state.get("failures") or 0) + 1
-            state["failures"] = failures
+        with self._model_lock(key):
+            state = self._model_failover_state.get(key) or ModelFailoverState()
+            failures = state.failures + 1
             cooldown = min(
                 self.config.model_cooldown_max_sec,
                 self.config.model_cooldown_base_sec * (5 ** max(0, failures - 1)),
             )
-            state["cooldown_until"] = now + cooldown
-            state["last_failed_at"] = now
-            return int(cooldown)
+            now = time.monotonic()
+            self._model_failover_state[key] = replace(
+                state,
+                failures=failures,
+                cooldown_until=now + cooldown,
+                last_failed_at=now,
+            )
+        return int(cooldown)
 
     def _model_cooldown_left(self, model: str) -> int:
+        if not self._model_failover_state:
+            return 0
         key = model.strip().lower()
         if not key:
             return 0
-        now = time.time()
-        with self._model_failover_lock:
-            state = self._model_failover_state.get(key) or {}
-            until = float(state.get("cooldown_until") or 0.0)
-        if until <= now:
+        state = self._model_failover_state.get(key)
+        if state is None:
             return 0
-        return int(until - now)
+        return max(0, int(state.cooldown_until - time.monotonic()))
 
     def _build_langchain_tools(self) -> list[Any]:
-        tools = [
-            self._StructuredTool.from_function(
-                name="run_shell",
-                description="Run a safe shell command in workspace. Supports simple commands without pipes.",
-                args_schema=RunShellArgs,
-                func=self._run_shell_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="list_directory",
-                description="List files in a workspace directory.",
-                args_schema=ListDirectoryArgs,
-                func=self._list_directory_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="read_text_file",
-                description=(
-                    "Read a local text/document file. Auto extracts text from PDF/DOCX/MSG/XLSX. "
-                    "Supports chunked reads with start_char, and optional line-mode reads with start_line/max_lines. "
-                    "For complete reading use max_chars up to 1000000 and continue while has_more=true."
-                ),
-                args_schema=ReadTextFileArgs,
-                func=self._read_text_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="search_text_in_file",
-                description=(
-                    "Search within a local text/document file and return matching evidence snippets. "
-                    "Use this first for specs/protocols/command codes; it expands hex variants like 15h/15 h/0x15."
-                ),
-                args_schema=SearchTextInFileArgs,
-                func=self._search_text_in_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="multi_query_search",
-                description="Run multiple file-search queries against one file and merge the matching evidence snippets.",
-                args_schema=MultiQuerySearchArgs,
-                func=self._multi_query_search_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="doc_index_build",
-                description="Build or inspect a cached PDF document index, including headings and cache status.",
-                args_schema=DocIndexBuildArgs,
-                func=self._doc_index_build_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="read_section_by_heading",
-                description="Read a document section by matching a heading or section number.",
-                args_schema=ReadSectionByHeadingArgs,
-                func=self._read_section_by_heading_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="table_extract",
-                description="Extract tables from a PDF/XLSX file, optionally narrowed by query or page hint.",
-                args_schema=TableExtractArgs,
-                func=self._table_extract_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="fact_check_file",
-                description="Check whether a file contains evidence that supports or conflicts with a claim.",
-                args_schema=FactCheckFileArgs,
-                func=self._fact_check_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="search_codebase",
-                description=(
-                    "Search code/text files under a local root and return file, line, and excerpt matches. "
-                    "If root is omitted, it defaults to '.' (the current workspace root)."
-                ),
-                args_schema=SearchCodebaseArgs,
-                func=self._search_codebase_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="copy_file",
-                description="Copy a file (binary-safe) from src_path to dst_path in allowed roots.",
-                args_schema=CopyFileArgs,
-                func=self._copy_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="extract_zip",
-                description="Extract a local .zip archive into a target directory (safe, with limits).",
-                args_schema=ExtractZipArgs,
-                func=self._extract_zip_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="extract_msg_attachments",
-                description=(
-                    "Extract attachments from a local .msg email into a target directory, "
-                    "then continue reading those files."
-                ),
-                args_schema=ExtractMsgAttachmentsArgs,
-                func=self._extract_msg_attachments_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="write_text_file",
-                description="Create or overwrite a UTF-8 text file in workspace.",
-                args_schema=WriteTextFileArgs,
-                func=self._write_text_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="append_text_file",
-                description="Append UTF-8 text to a file (or create if missing) in workspace.",
-                args_schema=AppendTextFileArgs,
-                func=self._append_text_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="replace_in_file",
-                description="Replace target text in a UTF-8 text file in workspace.",
-                args_schema=ReplaceInFileArgs,
-                func=self._replace_in_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="fetch_web",
-                description="Fetch web content from a URL for information lookup.",
-                args_schema=FetchWebArgs,
-                func=self._fetch_web_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="download_web_file",
-                description="Download and save a web file (binary-safe), e.g. PDF/ZIP/images.",
-                args_schema=DownloadWebFileArgs,
-                func=self._download_web_file_tool,
-            ),
-            self._StructuredTool.from_function(
-                name="search_web",
-                description="Search web by query and return candidate URLs/snippets before fetch_web.",
-                args_schema=SearchWebArgs,
-                func=self._search_web_tool,
-            ),
-        ]
+        # StructuredTool.from_function inspects and validates every schema. Build unbound templates
+        # once per process and give each agent cheap copies bound to its own methods.
+        specs = _LANGCHAIN_TOOL_SPECS
         if self.config.enable_session_tools:
-            tools.append(
-                self._StructuredTool.from_function(
-                    name="list_sessions",
-                    description="List recent local chat sessions for cross-session context lookup.",
-                    args_schema=ListSessionsArgs,
-                    func=self._list_sessions_tool,
-                )
-            )
-            tools.append(
+            specs = specs + _SESSION_LANGCHAIN_TOOL_SPECS
+        cache_key = (self._StructuredTool, bool(self.config.enable_session_tools))
+        templates = OfficeAgent._lc_tool_templates.get(cache_key)
+        if templates is None:
+            templates = tuple(
                 self._StructuredTool.from_function(
-                    name="read_session_history",
-                    description="Read one local chat session history by session_id.",
-                    args_schema=ReadSessionHistoryArgs,
-                    func=self._read_session_history_tool,
+                    name=name,
+                    description=description,
+                    args_schema=args_schema,
+                    func=getattr(OfficeAgent, method_name),
                 )
+                for name, description, args_schema, method_name in specs
             )
-        return tools
+            OfficeAgent._lc_tool_templates[cache_key] = templates
+        return [
+            template.model_copy(update={"func": getattr(self, method_name)})
+            for template, (_, _, _, method_name) in zip(templates, specs)
+        ]
 
     def _select_langchain_tools(self, tool_names: list[str] | None = None) -> list[Any]:
         if not tool_names:
@@ -8309,11 +8555,11 @@ class OfficeAgent:
 
     def _run_shell_tool(self, command: str, cwd: str = ".", timeout_sec: int = 15) -> str:
         result = self.tools.run_shell(command=command, cwd=cwd, timeout_sec=timeout_sec)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _list_directory_tool(self, path: str = ".", max_entries: int = 200) -> str:
         result = self.tools.list_directory(path=path, max_entries=max_entries)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _read_text_file_tool(
         self,
@@ -8330,7 +8576,7 @@ class OfficeAgent:
             start_line=start_line,
             max_lines=max_lines,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _search_text_in_file_tool(
         self, path: str, query: str, max_matches: int = 8, context_chars: int = 280
@@ -8341,7 +8587,7 @@ class OfficeAgent:
             max_matches=max_matches,
             context_chars=context_chars,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _multi_query_search_tool(
         self, path: str, queries: list[str], per_query_max_matches: int = 3, context_chars: int = 280
@@ -8352,15 +8598,15 @@ class OfficeAgent:
             per_query_max_matches=per_query_max_matches,
             context_chars=context_chars,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _doc_index_build_tool(self, path: str, force_rebuild: bool = False, max_headings: int = 400) -> str:
         result = self.tools.doc_index_build(path=path, force_rebuild=force_rebuild, max_headings=max_headings)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _read_section_by_heading_tool(self, path: str, heading: str, max_chars: int = 12000) -> str:
         result = self.tools.read_section_by_heading(path=path, heading=heading, max_chars=max_chars)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _table_extract_tool(
         self, path: str, query: str = "", page_hint: int = 0, max_tables: int = 5, max_rows: int = 25
@@ -8372,7 +8618,7 @@ class OfficeAgent:
             max_tables=max_tables,
             max_rows=max_rows,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _fact_check_file_tool(
         self, path: str, claim: str, queries: list[str] | None = None, max_evidence: int = 6
@@ -8383,7 +8629,7 @@ class OfficeAgent:
             queries=queries or [],
             max_evidence=max_evidence,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _search_codebase_tool(
         self,
@@ -8438,13 +8684,13 @@ class OfficeAgent:
                     merged["auto_root_fallback"] = True
                     merged["initial_root"] = "."
                     merged["searched_roots"] = searched_roots
-                    return json.dumps(merged, ensure_ascii=False)
+                    return dumps_json(merged)
             if isinstance(result, dict):
                 result = dict(result)
                 result["auto_root_fallback"] = True
                 result["initial_root"] = "."
                 result["searched_roots"] = searched_roots
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _copy_file_tool(
         self, src_path: str, dst_path: str, overwrite: bool = True, create_dirs: bool = True
@@ -8455,7 +8701,7 @@ class OfficeAgent:
             overwrite=overwrite,
             create_dirs=create_dirs,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _extract_zip_tool(
         self,
@@ -8474,7 +8720,7 @@ class OfficeAgent:
             max_entries=max_entries,
             max_total_bytes=max_total_bytes,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _extract_msg_attachments_tool(
         self,
@@ -8493,7 +8739,7 @@ class OfficeAgent:
             max_attachments=max_attachments,
             max_total_bytes=max_total_bytes,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _write_text_file_tool(
         self, path: str, content: str, overwrite: bool = True, create_dirs: bool = True
@@ -8504,7 +8750,7 @@ class OfficeAgent:
             overwrite=overwrite,
             create_dirs=create_dirs,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _append_text_file_tool(
         self,
@@ -8519,7 +8765,7 @@ class OfficeAgent:
             create_if_missing=create_if_missing,
             create_dirs=create_dirs,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _replace_in_file_tool(
         self,
@@ -8536,11 +8782,11 @@ class OfficeAgent:
             replace_all=replace_all,
             max_replacements=max_replacements,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _fetch_web_tool(self, url: str, max_chars: int = 120000, timeout_sec: int = 12) -> str:
         result = self.tools.fetch_web(url=url, max_chars=max_chars, timeout_sec=timeout_sec)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _download_web_file_tool(
         self,
@@ -8559,19 +8805,19 @@ class OfficeAgent:
             timeout_sec=timeout_sec,
             max_bytes=max_bytes,
         )
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _search_web_tool(self, query: str, max_results: int = 5, timeout_sec: int = 12) -> str:
         result = self.tools.search_web(query=query, max_results=max_results, timeout_sec=timeout_sec)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _list_sessions_tool(self, max_sessions: int = 20) -> str:
         result = self.tools.list_sessions(max_sessions=max_sessions)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _read_session_history_tool(self, session_id: str, max_turns: int = 80) -> str:
         result = self.tools.read_session_history(session_id=session_id, max_turns=max_turns)
-        return json.dumps(result, ensure_ascii=False)
+        return dumps_json(result)
 
     def _build_user_content(
         self, user_message: str, attachment_metas: list[dict[str, Any]], history_turn_count: int = 0
@@ -8592,24 +8838,7 @@ class OfficeAgent:
             except Exception:
                 file_size = 0
             if (not file_size) and path:
-                try:
-                    file_size = Path(path).stat().st_size
-                except Exception:
-                    file_size = 0
-            local_path_line = f"本地路径: {path}\n" if path else ""
-            file_size_line = f"文件大小: {self._format_bytes(file_size)}\n" if file_size > 0 else ""
-            zip_hint_line = (
-                "该文件是 ZIP，若需要解压可调用 extract_zip(zip_path=该路径, dst_dir=目标目录)。\n"
-                if suffix == ".zip"
-                else ""
-            )
-            msg_hint_line = (
-                "该文件是 MSG 邮件；若需读取其中附件（如 xlsx/png），先调用 "
-                "extract_msg_attachments(msg_path=该路径, dst_dir=目标目录)。"
-                "当用户说“完整/全部解释邮件”时，必须执行该步骤，不要跳过。\n"
-                if suffix == ".msg"
-                else ""
-            )
+                file_size = self._attachment_file_size(path)
 
             if kind == "document":
                 if history_turn_count > 0 and file_size > _FOLLOWUP_INLINE_MAX_BYTES:
@@ -8618,7 +8847,7 @@ class OfficeAgent:
                             "type": "text",
                             "text": (
                                 f"[附件文档: {name}] 当前为跟进轮次，为避免重复消耗 token，本轮默认仅提供路径。\n"
-                                f"{local_path_line}{file_size_line}{zip_hint_line}{msg_hint_line}"
+                                f"{self._attachment_header(path, suffix, file_size=file_size)}"
                                 "若任务是在规范/协议中定位章节或命令码，先调用 search_text_in_file(path=该路径, query=目标关键词)；"
                                 "若用户已给出章节/heading，优先调用 read_section_by_heading(path=该路径, heading=...)；"
                                 "若用户提到表格/opcode 表，优先调用 table_extract(path=该路径, query=...)；"
@@ -8638,7 +8867,7 @@ class OfficeAgent:
                             "type": "text",
                             "text": (
                                 f"[附件文档: {name}] 文件较大，为避免首轮请求长时间无响应，本轮不自动注入全文。\n"
-                                f"{local_path_line}{file_size_line}{zip_hint_line}{msg_hint_line}"
+                                f"{self._attachment_header(path, suffix, file_size=file_size)}"
                                 "若任务是在规范/协议中定位章节或命令码，先调用 search_text_in_file(path=该路径, query=目标关键词)；"
                                 "若用户已给出章节/heading，优先调用 read_section_by_heading(path=该路径, heading=...)；"
                                 "若用户提到表格/opcode 表，优先调用 table_extract(path=该路径, query=...)；"
@@ -8657,7 +8886,7 @@ class OfficeAgent:
                     parts.append(
                         {
                             "type": "text",
-                            "text": f"\n[附件文档: {name}]\n{local_path_line}{zip_hint_line}{msg_hint_line}{extracted}",
+                            "text": f"\n[附件文档: {name}]\n{self._attachment_header(path, suffix)}{extracted}",
                         }
                     )
                     notes.append(f"文档:{name}")
@@ -8671,7 +8900,7 @@ class OfficeAgent:
                                 "type": "text",
                                 "text": (
                                     f"[附件文档: {name}] 未识别为结构化文本，已附带文件预览。\n"
-                                    f"{local_path_line}{zip_hint_line}{msg_hint_line}{preview}"
+                                    f"{self._attachment_header(path, suffix)}{preview}"
                                 ),
                             }
                         )
@@ -8684,6 +8913,7 @@ class OfficeAgent:
             elif kind == "image":
                 try:
                     data_url, warn = image_to_data_url_with_meta(path, mime)
+                    local_path_line = f"本地路径: {path}\n" if path else ""
                     parts.append({"type": "text", "text": f"[附件图片: {name}]\n{local_path_line}"})
                     parts.append({"type": "image_url", "image_url": {"url": data_url}})
                     notes.append(f"图片:{name}")
@@ -8701,7 +8931,7 @@ class OfficeAgent:
                             "type": "text",
                             "text": (
                                 f"[附件: {name}] 二进制/未知类型，已附带文件预览。\n"
-                                f"{local_path_line}{zip_hint_line}{preview}"
+                                f"{self._attachment_header(path, suffix, msg_hint=False)}{preview}"
                             ),
                         }
                     )
@@ -8714,6 +8944,29 @@ class OfficeAgent:
 
         return parts, "；".join(notes), issues
 
+    def _attachment_header(self, path: str, suffix: str, *, file_size: int = 0, msg_hint: bool = True) -> str:
+        header = f"本地路径: {path}\n" if path else ""
+        if file_size > 0:
+            header += f"文件大小: {self._format_bytes(file_size)}\n"
+        if suffix == ".zip":
+            header += _ZIP_ATTACHMENT_HINT
+        elif msg_hint and suffix == ".msg":
+            header += _MSG_ATTACHMENT_HINT
+        return header
+
+    def _attachment_file_size(self, path: str) -> int:
+        # Stored uploads do not change after upload, so follow-up turns can reuse the first stat.
+        size = self._attachment_size_cache.get(path)
+        if size is None:
+            try:
+                size = os.stat(path).st_size
+            except Exception:
+                return 0
+            if len(self._attachment_size_cache) >= _ATTACHMENT_SIZE_CACHE_MAX_ENTRIES:
+                self._attachment_size_cache.clear()
+            self._attachment_size_cache[path] = size
+        return size
+
     def _prepare_tool_result_for_llm(
         self,
         name: str,
@@ -8731,38 +8984,32 @@ class OfficeAgent:
 
     def _prune_old_tool_messages(self, messages: list[Any]) -> int:
         keep_last = max(0, int(self.config.tool_context_prune_keep_last))
-        tool_indexes: list[int] = []
+        # One reverse pass: the newest keep_last tool results are kept, older unmasked ones become
+        # candidates, and the total size that decides whether to prune at all is summed as we go.
+        kept = 0
         total_chars = 0
-        for idx, msg in enumerate(messages):
-            if type(msg).__name__ == "ToolMessage":
-                tool_indexes.append(idx)
-                total_chars += len(self._content_to_text(getattr(msg, "content", "")))
-        if total_chars <= int(self.config.tool_result_hard_clear_chars):
-            return 0
-        if len(tool_indexes) <= keep_last:
+        candidates: list[int] = []
+        tool_message_cls = self._ToolMessage
+        for idx in range(len(messages) - 1, -1, -1):
+            msg = messages[idx]
+            if not isinstance(msg, tool_message_cls):
+                continue
+            content = getattr(msg, "content", "")
+            total_chars += len(content) if isinstance(content, str) else len(self._content_to_text(content))
+            if kept < keep_last:
+                kept += 1
+            elif content != _PRUNED_TOOL_RESULT_CONTENT:
+                candidates.append(idx)
+        if not candidates or total_chars <= int(self.config.tool_result_hard_clear_chars):
             return 0
 
-        pruned = 0
-        candidates = tool_indexes[:-keep_last] if keep_last > 0 else tool_indexes
+        # Mask in place rather than dropping messages: indices and tool_call ids stay stable, and
+        # already-masked entries are left untouched so the shared prompt prefix does not change.
+        # model_copy swaps only the content and skips re-validating the message.
+        masked = {"content": _PRUNED_TOOL_RESULT_CONTENT}
         for idx in candidates:
-            msg = messages[idx]
-            content = self._content_to_text(getattr(msg, "content", ""))
-            if "[tool_result_pruned]" in content:
-                continue
-            tool_call_id = str(getattr(msg, "tool_call_id", "") or f"pruned_{idx}")
-            name = str(getattr(msg, "name", "") or "tool")
-            placeholder = {
-                "tool": name,
-                "trimmed": "history_pruned",
-                "note": "Older tool result pruned to control context growth.",
-            }
-            messages[idx] = self._ToolMessage(
-                content=json.dumps(placeholder, ensure_ascii=False),
-                tool_call_id=tool_call_id,
-                name=name,
-            )
-            pruned += 1
-        return pruned
+            messages[idx] = messages[idx].model_copy(update=masked)
+        return len(candidates)
 
     def _content_to_text(self, content: Any) -> str:
         if isinstance(content, str):
@@ -8770,24 +9017,12 @@ class OfficeAgent:
         if not isinstance(content, list):
             return str(content or "")
 
-        out: list[str] = []
-        for item in content:
-            if isinstance(item, str):
-                out.append(item)
-                continue
-            if not isinstance(item, dict):
-                out.append(str(item))
-                continue
-
-            item_type = item.get("type")
-            if item_type in {"text", "output_text", "input_text"}:
-                text = item.get("text")
-                if isinstance(text, str) and text:
-                    out.append(text)
-        return "\n".join(out).strip()
+        return "\n".join(
+            text for item in content if (text := _content_part_text(item)) is not None
+        ).strip()
 
     def _shorten(self, text: Any, limit: int = 800) -> str:
-        raw = str(text or "")
+        raw = text if isinstance(text, str) else str(text or "")
         if len(raw) <= limit:
             return raw
         return f"{raw[:limit]}\n...[truncated {len(raw) - limit} chars]"
@@ -8797,16 +9032,7 @@ class OfficeAgent:
             size = float(value or 0)
         except Exception:
             return "0 B"
-        if size <= 0:
-            return "0 B"
-        units = ["B", "KiB", "MiB", "GiB", "TiB"]
-        idx = 0
-        while size >= 1024 and idx < len(units) - 1:
-            size /= 1024.0
-            idx += 1
-        if idx == 0:
-            return f"{int(size)} {units[idx]}"
-        return f"{size:.2f} {units[idx]}"
+        return _format_byte_size(size)
 
     def _looks_like_spec_lookup_request(self, user_message: str, attachment_metas: list[dict[str, Any]]) -> bool:
         return looks_like_spec_lookup_request_helper(self, user_message, attachment_metas)
@@ -8871,24 +9097,21 @@ class OfficeAgent:
         )
 
     def _summarize_message_roles(self, messages: list[Any]) -> str:
-        counts: dict[str, int] = {}
-        for msg in messages:
-            role = type(msg).__name__
-            counts[role] = counts.get(role, 0) + 1
-        parts = [f"{k}={v}" for k, v in sorted(counts.items())]
-        return ", ".join(parts) if parts else "(empty)"
+        counts: Counter[str] = Counter()
+        for cls, count in Counter(map(type, messages)).items():
+            counts[cls.__name__] += count
+        return ", ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "(empty)"
 
     def _serialize_messages_for_debug(self, messages: list[Any], raw_mode: bool = False) -> str:
-        lines: list[str] = []
         max_content = 120000 if raw_mode else 1600
-        for idx, msg in enumerate(messages, start=1):
-            role = type(msg).__name__
-            content = getattr(msg, "content", "")
-            lines.append(f"msg {idx} | {role}")
-            rendered = self._shorten(self._serialize_content_for_debug(content, raw_mode=raw_mode), max_content)
-            lines.append(self._indent_block(rendered, prefix="  "))
-            lines.append("")
-        return "\n".join(lines).strip()
+
+        def render(idx: int, msg: Any) -> str:
+            rendered = self._serialize_content_for_debug(getattr(msg, "content", ""), raw_mode=raw_mode)
+            if len(rendered) > max_content:
+                rendered = self._shorten(rendered, max_content)
+            return f"msg {idx} | {type(msg).__name__}\n{self._indent_block(rendered, prefix='  ')}\n\n"
+
+        return "".join(render(idx, msg) for idx, msg in enumerate(messages, start=1)).strip()
 
     def _serialize_content_for_debug(self, content: Any, raw_mode: bool = False) -> str:
         if isinstance(content, str):
@@ -8916,10 +9139,10 @@ class OfficeAgent:
                     else:
                         lines.append(f"part {idx} | image_url(data_url_len={len(url)}) [omitted]")
                 else:
-                    lines.append(f"part {idx} | {json.dumps(item, ensure_ascii=False, default=str)}")
+                    lines.append(f"part {idx} | {dumps_json(item)}")
                 continue
 
-            lines.append(f"part {idx} | {json.dumps(item, ensure_ascii=False, default=str)}")
+            lines.append(f"part {idx} | {dumps_json(item)}")
         return "\n".join(lines)
 
     def _summarize_ai_response(self, ai_msg: Any, raw_mode: bool = False) -> str:
@@ -8940,9 +9163,7 @@ class OfficeAgent:
                 args = call.get("args") or {}
                 if not isinstance(args, dict):
                     args = {}
-                lines.append(
-                    f"call {idx} | {name}(args={self._shorten(json.dumps(args, ensure_ascii=False), 600)})"
-                )
+                lines.append(f"call {idx} | {name}(args={self._shorten_args_for_log(args, 600)})")
 
         text = self._content_to_text(getattr(ai_msg, "content", ""))
         if text.strip():
@@ -8952,8 +9173,22 @@ class OfficeAgent:
             lines.append("empty response content")
         return "\n".join(lines)
 
+    def _shorten_args_for_log(self, args: dict[str, Any], limit: int) -> str:
+        # Encode pair by pair; pairs past the limit are only measured for the truncation count and
+        # never joined into the output. size is the exact length of the joined JSON object.
+        parts: list[str] = []
+        size = 0
+        for key, value in args.items():
+            part = f"{json.dumps(str(key), ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False, default=str)}"
+            if size <= limit:
+                parts.append(part)
+            size += len(part) + 2
+        if size <= limit:
+            return "{" + ", ".join(parts) + "}"
+        return f"{('{' + ', '.join(parts))[:limit]}\n...[truncated {size - limit} chars]"
+
     def _indent_block(self, text: Any, prefix: str = "  ") -> str:
-        raw = str(text or "")
+        raw = text if isinstance(text, str) else str(text or "")
         if not raw:
             return ""
         return "\n".join(f"{prefix}{line}" if line else prefix.rstrip() for line in raw.splitlines())
@@ -8991,34 +9226,34 @@ class OfficeAgent:
         return merged
 
     def _extract_usage_from_message(self, message: Any) -> dict[str, int]:
-        usage = self._empty_usage()
+        input_tokens = output_tokens = total_tokens = 0
 
         usage_metadata = getattr(message, "usage_metadata", None)
         if isinstance(usage_metadata, dict):
-            usage["input_tokens"] = int(usage_metadata.get("input_tokens") or usage_metadata.get("prompt_tokens") or 0)
-            usage["output_tokens"] = int(
-                usage_metadata.get("output_tokens") or usage_metadata.get("completion_tokens") or 0
-            )
-            usage["total_tokens"] = int(usage_metadata.get("total_tokens") or 0)
+            input_tokens = _first_int(usage_metadata, "input_tokens", "prompt_tokens")
+            output_tokens = _first_int(usage_metadata, "output_tokens", "completion_tokens")
+            total_tokens = _first_int(usage_metadata, "total_tokens")
 
         response_metadata = getattr(message, "response_metadata", None)
         if isinstance(response_metadata, dict):
             token_usage = response_metadata.get("token_usage")
             if isinstance(token_usage, dict):
-                if usage["input_tokens"] <= 0:
-                    usage["input_tokens"] = int(token_usage.get("prompt_tokens") or token_usage.get("input_tokens") or 0)
-                if usage["output_tokens"] <= 0:
-                    usage["output_tokens"] = int(
-                        token_usage.get("completion_tokens") or token_usage.get("output_tokens") or 0
-                    )
-                if usage["total_tokens"] <= 0:
-                    usage["total_tokens"] = int(token_usage.get("total_tokens") or 0)
+                if input_tokens <= 0:
+                    input_tokens = _first_int(token_usage, "prompt_tokens", "input_tokens")
+                if output_tokens <= 0:
+                    output_tokens = _first_int(token_usage, "completion_tokens", "output_tokens")
+                if total_tokens <= 0:
+                    total_tokens = _first_int(token_usage, "total_tokens")
 
-        if usage["total_tokens"] <= 0:
-            usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        if total_tokens <= 0:
+            total_tokens = input_tokens + output_tokens
 
-        usage["llm_calls"] = 1 if (usage["input_tokens"] > 0 or usage["output_tokens"] > 0 or usage["total_tokens"] > 0) else 0
-        return usage
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": total_tokens,
+            "llm_calls": 1 if (input_tokens > 0 or output_tokens > 0 or total_tokens > 0) else 0,
+        }
 
     def _normalize_base_url(self, raw_url: str) -> str:
         """
@@ -9027,42 +9262,17 @@ class OfficeAgent:
         url = raw_url.strip().strip("\"'").rstrip("/")
         parsed = urlparse(url)
         path = parsed.path or ""
-        suffixes = ["/chat/completions", "/responses", "/v1/chat/completions", "/v1/responses"]
         lowered = path.lower()
-        for suffix in suffixes:
-            if lowered.endswith(suffix):
-                path = path[: -len(suffix)] + ("/v1" if suffix.startswith("/v1/") else "")
-                break
+        if lowered.endswith(_ENDPOINT_PATH_SUFFIXES):
+            for suffix in _ENDPOINT_PATH_SUFFIXES:
+                if lowered.endswith(suffix):
+                    path = path[: -len(suffix)]
+                    break
         normalized = urlunparse((parsed.scheme, parsed.netloc, path.rstrip("/"), parsed.params, parsed.query, parsed.fragment))
         return normalized
 
     def _is_failover_error(self, exc: Exception) -> bool:
-        text = str(exc).lower()
-        hints = (
-            "429",
-            "rate limit",
-            "rate_limit",
-            "timeout",
-            "timed out",
-            "temporarily unavailable",
-            "service unavailable",
-            "overloaded",
-            "connection reset",
-            "connection aborted",
-            "connection error",
-            "502",
-            "503",
-            "504",
-            "quota",
-            "insufficient",
-            "authentication",
-            "unauthorized",
-            "forbidden",
-            "401",
-            "403",
-        )
-        return any(item in text for item in hints)
+        return _FAILOVER_ERROR_RE.search(str(exc).lower()) is not None
 
     def _is_405_error(self, exc: Exception) -> bool:
-        text = str(exc).lower()
-        return "405" in text or "method not allowed" in text
+        return _METHOD_NOT_ALLOWED_RE.search(str(exc).lower()) is not None
@@ -2,25 +2,104 @@ from __future__ import annotations
 
 import base64
 import io
+import mmap
+import os
 import re
+import threading
 import zipfile
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from datetime import date, datetime, time
+from functools import lru_cache
 from html import unescape
 from pathlib import Path
+from typing import Any, Callable, Iterator
 
 from app.document_text import extract_pdf_text_from_path, truncate_text
 
+try:
+    import pybase64
+except Exception:  # pragma: no cover - optional SIMD codec, stdlib base64 is the fallback
+    pybase64 = None
+
 _OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+_ZIP_MAGIC = b"PK\x03\x04"
 _MSG_MARKERS_ASCII = (b"__substg1.0_", b"IPM.")
 _MSG_MARKERS_UTF16 = tuple(marker.decode("ascii").encode("utf-16-le") for marker in _MSG_MARKERS_ASCII)
+# OLE2 directory entry names are UTF-16, so the UTF-16 markers usually hit first on real MSG files.
+_MSG_SNIFF_MARKERS = _MSG_MARKERS_UTF16 + _MSG_MARKERS_ASCII
+# MSG property-stream names live in the OLE2 directory, which can sit well past the header.
+_MSG_SNIFF_WINDOW_BYTES = 512 * 1024
 _XLSX_SUFFIXES = {".xlsx", ".xlsm", ".xltx", ".xltm"}
 _PPTX_SUFFIXES = {".pptx", ".pptm"}
 _SAFE_IMAGE_MIMES = {"image/png", "image/jpeg", "image/webp", "image/gif"}
+# <br> and closing block tags both end a line, so one pass handles them.
+_HTML_LINE_BREAK_RE = re.compile(r"(?i)<br\s*/?>|</(?:p|div|li|tr|h[1-6]|section|article)>")
+# Whole script/style elements and every remaining tag become a space in a single pass. Line breaks
+# are inserted first; any that land inside a script/style body are dropped along with it.
+_HTML_STRIP_RE = re.compile(r"(?is)<(script|style).*?>.*?</\1>|<[^>]+>")
+_PPTX_SLIDE_NUMBER_RE = re.compile(r"slide(\d+)\.xml$")
+_NON_CONTROL_BYTES = bytes(b for b in range(256) if b >= 32 or b in b"\n\r\t")
+_TEXT_BYTES = b"\n\r\t\b\f" + bytes(range(32, 127))
+
+
+# Optional parsers are imported on first use and memoized.
+@lru_cache(maxsize=None)
+def _docx_document_cls() -> Any:
+    from docx import Document  # lazy import
+
+    return Document
+
+
+@lru_cache(maxsize=None)
+def _openpyxl_load_workbook() -> Any:
+    from openpyxl import load_workbook  # lazy import
+
+    return load_workbook
+
+
+@lru_cache(maxsize=None)
+def _extract_msg_module() -> Any:
+    import extract_msg  # lazy import
+
+    return extract_msg
+
+
+@lru_cache(maxsize=None)
+def _pil_image_module() -> Any:
+    from PIL import Image  # lazy import
+
+    return Image
+
+
+@lru_cache(maxsize=None)
+def _pyvips_module() -> Any:
+    # Optional: importing pyvips also loads libvips, which may be absent even when the wheel is not.
+    try:
+        import pyvips  # lazy import
+    except Exception:
+        return None
+    return pyvips
+
+
+@lru_cache(maxsize=None)
+def _heif_image_module() -> Any:
+    from pillow_heif import register_heif_opener  # lazy import
+
+    register_heif_opener()
+    return _pil_image_module()
 
 
 def _read_plain_text(path: Path, max_chars: int) -> str:
-    text = path.read_text(encoding="utf-8", errors="ignore")
-    return truncate_text(text, max_chars)
+    # UTF-8 needs at most 4 bytes per char, so this window always covers max_chars.
+    window = max(0, int(max_chars)) * 4 + 4096
+    with path.open("rb") as fp:
+        raw = fp.read(window)
+        has_more = bool(fp.read(1))
+        source_bytes = os.fstat(fp.fileno()).st_size if has_more else None
+    # Match text-mode reads: universal newlines turn CRLF and lone CR into "\n".
+    text = raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+    return truncate_text(text, max_chars, source_bytes=source_bytes)
 
 
 def _extract_pdf(path: Path, max_chars: int) -> str:
@@ -28,14 +107,32 @@ def _extract_pdf(path: Path, max_chars: int) -> str:
 
 
 def _extract_docx(path: Path, max_chars: int) -> str:
-    from docx import Document  # lazy import
-
-    doc = Document(str(path))
+    doc = _docx_document_cls()(str(path))
     text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
     return truncate_text(text, max_chars)
 
 
+def _xlsx_float_to_text(value: float) -> str:
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+# Keyed on exact type: bool is its own key, so True never hits int.
+_XLSX_CELL_FORMATTERS: dict[type, Callable[[Any], str]] = {
+    str: str.strip,
+    int: str,
+    float: _xlsx_float_to_text,
+    bool: lambda value: "TRUE" if value else "FALSE",
+    type(None): lambda value: "",
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+}
+
+
 def _xlsx_cell_to_text(value: object) -> str:
+    formatter = _XLSX_CELL_FORMATTERS.get(type(value))
+    if formatter is not None:
+        return formatter(value)
     if value is None:
         return ""
     if isinstance(value, bool):
@@ -55,83 +152,105 @@ def _xlsx_cell_to_text(value: object) -> str:
     return str(value).strip()
 
 
+def _zip_has_member(zf: zipfile.ZipFile, name: str) -> bool:
+    try:
+        zf.getinfo(name)
+    except KeyError:
+        return False
+    return True
+
+
+def _zip_looks_like_xlsx(zf: zipfile.ZipFile) -> bool:
+    return _zip_has_member(zf, "xl/workbook.xml")
+
+
+def _zip_looks_like_pptx(zf: zipfile.ZipFile) -> bool:
+    if not _zip_has_member(zf, "ppt/presentation.xml"):
+        return False
+    return any(name.startswith("ppt/slides/slide") and name.endswith(".xml") for name in zf.namelist())
+
+
 def looks_like_xlsx_file(path: Path) -> bool:
     try:
-        if not zipfile.is_zipfile(path):
-            return False
         with zipfile.ZipFile(path, "r") as zf:
-            names = set(zf.namelist())
-        return "xl/workbook.xml" in names
+            return _zip_looks_like_xlsx(zf)
     except Exception:
         return False
 
 
 def looks_like_pptx_file(path: Path) -> bool:
     try:
-        if not zipfile.is_zipfile(path):
-            return False
         with zipfile.ZipFile(path, "r") as zf:
-            names = set(zf.namelist())
-        if "ppt/presentation.xml" not in names:
-            return False
-        return any(name.startswith("ppt/slides/slide") and name.endswith(".xml") for name in names)
+            return _zip_looks_like_pptx(zf)
     except Exception:
         return False
 
 
 def _extract_xlsx(path: Path, max_chars: int) -> str:
     try:
-        from openpyxl import load_workbook  # lazy import
+        load_workbook = _openpyxl_load_workbook()
     except Exception as exc:
         raise RuntimeError(
             "解析 .xlsx 需要依赖 openpyxl。请执行 `pip install -r requirements.txt` 后重试。"
         ) from exc
 
-    wb = load_workbook(filename=str(path), read_only=True, data_only=True)
+    # openpyxl rejects paths whose suffix is not an Excel one, so sniffed workbooks (.bin, .zip, ...)
+    # are handed over as an open file instead.
+    source = str(path) if path.suffix.lower() in _XLSX_SUFFIXES else path.open("rb")
+    try:
+        wb = load_workbook(filename=source, read_only=True, data_only=True)
+    except Exception:
+        if not isinstance(source, str):
+            source.close()
+        raise
     try:
-        lines: list[str] = ["[Excel 工作簿解析]"]
-        total_chars = len(lines[0])
+        # Rows are written straight into one buffer; its position doubles as the running length.
+        buffer = io.StringIO()
+        buffer.write("[Excel 工作簿解析]")
         truncated = False
         for sheet in wb.worksheets:
             title = (sheet.title or "").strip() or "Sheet"
-            sheet_header = f"\n--- Sheet: {title} ---"
-            lines.append(sheet_header)
-            total_chars += len(sheet_header)
-            if total_chars >= max_chars:
+            buffer.write(f"\n\n--- Sheet: {title} ---")
+            if buffer.tell() >= max_chars:
                 truncated = True
                 break
 
             sheet_rows = 0
             for row_idx, row in enumerate(sheet.iter_rows(values_only=True), start=1):
-                cells = [_xlsx_cell_to_text(cell) for cell in row]
-                while cells and not cells[-1]:
-                    cells.pop()
-                if not cells or not any(cells):
+                # openpyxl pads rows to the sheet's max_column and yields filler rows for gaps in
+                # sparse sheets; skip all-None rows before formatting any cell.
+                if row.count(None) == len(row):
+                    continue
+                cells = list(map(_xlsx_cell_to_text, row))
+                # Trailing blanks are trimmed by index; a row with no non-empty cell ends at 0.
+                end = len(cells)
+                while end and not cells[end - 1]:
+                    end -= 1
+                if not end:
                     continue
 
-                row_line = f"{row_idx}: " + " | ".join(cells)
-                lines.append(row_line)
-                total_chars += len(row_line)
+                buffer.write(f"\n{row_idx}: ")
+                buffer.write(" | ".join(cells if end == len(cells) else cells[:end]))
                 sheet_rows += 1
-                if total_chars >= max_chars:
+                if buffer.tell() >= max_chars:
                     truncated = True
                     break
 
             if sheet_rows == 0:
-                empty_line = "[空表或无可读内容]"
-                lines.append(empty_line)
-                total_chars += len(empty_line)
+                buffer.write("\n[空表或无可读内容]")
             if truncated:
                 break
 
         if truncated:
-            lines.append("\n[内容已截断，工作簿内容较大]")
-        return truncate_text("\n".join(lines), max_chars)
+            buffer.write("\n\n[内容已截断，工作簿内容较大]")
+        return truncate_text(buffer.getvalue(), max_chars)
     finally:
         try:
             wb.close()
         except Exception:
             pass
+        if not isinstance(source, str):
+            source.close()
 
 
 def _ppt_xml_to_lines(raw_xml: bytes, per_slide_limit: int = 40) -> list[str]:
@@ -187,7 +306,7 @@ def _extract_pptx(path: Path, max_chars: int) -> str:
             return "[PPTX 解析结果为空: 未找到 slide XML]"
 
         def sort_key(name: str) -> tuple[int, str]:
-            m = re.search(r"slide(\d+)\.xml$", name)
+            m = _PPTX_SLIDE_NUMBER_RE.search(name)
             return (int(m.group(1)) if m else 10**9, name)
 
         slide_names.sort(key=sort_key)
@@ -233,15 +352,11 @@ def _extract_pptx(path: Path, max_chars: int) -> str:
 
 
 def _html_to_text(html: str) -> str:
-    raw = html or ""
-    raw = re.sub(r"(?is)<(script|style).*?>.*?</\1>", " ", raw)
-    raw = re.sub(r"(?i)<br\\s*/?>", "\n", raw)
-    raw = re.sub(r"(?i)</(p|div|li|tr|h1|h2|h3|h4|h5|h6|section|article)>", "\n", raw)
-    raw = re.sub(r"(?s)<[^>]+>", " ", raw)
+    raw = _HTML_STRIP_RE.sub(" ", _HTML_LINE_BREAK_RE.sub("\n", html or ""))
     raw = unescape(raw)
     lines: list[str] = []
     for line in raw.splitlines():
-        normalized = re.sub(r"\s+", " ", line).strip()
+        normalized = " ".join(line.split())
         if normalized:
             lines.append(normalized)
     return "\n".join(lines)
@@ -313,7 +428,7 @@ def _extract_xml_feed(path: Path, max_chars: int) -> str:
             if entry_updated:
                 lines.append(f"   更新时间: {entry_updated}")
             if entry_summary:
-                entry_summary_clean = re.sub(r"\s+", " ", entry_summary).strip()
+                entry_summary_clean = " ".join(entry_summary.split())
                 lines.append(f"   摘要: {entry_summary_clean}")
     elif root_name == "rss":
         lines.append("[RSS Feed 解析]")
@@ -340,7 +455,7 @@ def _extract_xml_feed(path: Path, max_chars: int) -> str:
             if item_date:
                 lines.append(f"   时间: {item_date}")
             if item_desc:
-                item_desc_clean = re.sub(r"\s+", " ", item_desc).strip()
+                item_desc_clean = " ".join(item_desc.split())
                 lines.append(f"   摘要: {item_desc_clean}")
     else:
         return truncate_text(raw_text, max_chars)
@@ -348,10 +463,42 @@ def _extract_xml_feed(path: Path, max_chars: int) -> str:
     return truncate_text("\n".join(lines).strip(), max_chars)
 
 
+def _sniff_text_encoding(raw: bytes) -> str:
+    if raw.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    if raw.startswith(b"\xff\xfe"):
+        return "utf-16"
+    if raw.startswith(b"\xfe\xff"):
+        return "utf-16"
+    # BOM-less UTF-16 text from MSG properties is mostly ASCII, so one byte of each pair is NUL.
+    # Binary blobs can interleave NULs too; only a printable decode counts, so their NULs still
+    # reach _looks_binaryish_text.
+    sample = raw[:2048]
+    quarter = len(sample) // 4
+    if sample[1::2].count(0) > quarter and _is_mostly_printable(sample.decode("utf-16-le", errors="ignore")):
+        return "utf-16-le"
+    if sample[::2].count(0) > quarter and _is_mostly_printable(sample.decode("utf-16-be", errors="ignore")):
+        return "utf-16-be"
+    return "utf-8"
+
+
+def _is_mostly_printable(text: str) -> bool:
+    if not text:
+        return False
+    printable = sum(1 for ch in text if ch.isprintable() or ch in "\n\r\t")
+    return printable >= len(text) * 0.95
+
+
 def _decode_bytes_best_effort(raw: bytes) -> str:
     if not raw:
         return ""
+    sniffed = _sniff_text_encoding(raw)
+    out = raw.decode(sniffed, errors="ignore")
+    if out.strip():
+        return out
     for encoding in ("utf-8", "utf-16-le", "utf-16-be", "latin-1"):
+        if encoding == sniffed:
+            continue
         try:
             out = raw.decode(encoding, errors="ignore")
         except Exception:
@@ -368,13 +515,9 @@ def _looks_binaryish_text(text: str) -> bool:
     if not sample:
         return False
 
-    bad = 0
-    for ch in sample:
-        code = ord(ch)
-        if code == 0:
-            bad += 3
-        elif code < 32 and ch not in "\n\r\t":
-            bad += 1
+    # In UTF-8 only C0 controls encode to bytes < 0x20, so counting bytes counts chars.
+    raw = sample.encode("utf-8", "surrogatepass")
+    bad = len(raw.translate(None, _NON_CONTROL_BYTES)) + 2 * raw.count(0)
 
     ratio = bad / max(1, len(sample))
     return ratio >= 0.02
@@ -383,18 +526,16 @@ def _looks_binaryish_text(text: str) -> bool:
 def looks_like_outlook_msg_bytes(raw: bytes) -> bool:
     if not raw or not raw.startswith(_OLE2_MAGIC):
         return False
-    head = raw[: max(4096, min(len(raw), 512 * 1024))]
-    if any(marker in head for marker in _MSG_MARKERS_ASCII):
-        return True
-    if any(marker in head for marker in _MSG_MARKERS_UTF16):
-        return True
-    return False
+    return any(raw.find(marker, 0, _MSG_SNIFF_WINDOW_BYTES) != -1 for marker in _MSG_SNIFF_MARKERS)
 
 
 def looks_like_outlook_msg_file(path: Path) -> bool:
     try:
         with path.open("rb") as fp:
-            head = fp.read(512 * 1024)
+            magic = fp.read(len(_OLE2_MAGIC))
+            if magic != _OLE2_MAGIC:
+                return False
+            head = magic + fp.read(_MSG_SNIFF_WINDOW_BYTES - len(magic))
     except Exception:
         return False
     return looks_like_outlook_msg_bytes(head)
@@ -481,9 +622,13 @@ def _format_msg_attachment_line(att: object, idx: int) -> str:
     return f"- {name}"
 
 
+def _msg_field_text(value: object) -> str:
+    return str(value or "").strip()
+
+
 def _extract_outlook_msg(path: Path, max_chars: int) -> str:
     try:
-        import extract_msg  # lazy import
+        extract_msg = _extract_msg_module()
     except Exception as exc:
         raise RuntimeError(
             "解析 .msg 需要依赖 extract-msg。请执行 `pip install -r requirements.txt` 后重试。"
@@ -491,42 +636,27 @@ def _extract_outlook_msg(path: Path, max_chars: int) -> str:
 
     msg = extract_msg.openMsg(str(path), strict=False, delayAttachments=False)
     try:
-        subject = (msg.subject or "").strip()
-        sender = (msg.sender or "").strip()
-        to = (msg.to or "").strip()
-        cc = (msg.cc or "").strip()
-        date = str(msg.date or "").strip()
-        class_type = str(getattr(msg, "classType", "") or "").strip()
+        headers = (
+            ("消息类型", _msg_field_text(getattr(msg, "classType", ""))),
+            ("主题", _msg_field_text(msg.subject)),
+            ("发件人", _msg_field_text(msg.sender)),
+            ("收件人", _msg_field_text(msg.to)),
+            ("抄送", _msg_field_text(msg.cc)),
+            ("时间", _msg_field_text(msg.date)),
+        )
         body = _extract_msg_body(msg)
-
-        attachment_lines: list[str] = []
-        for idx, att in enumerate(getattr(msg, "attachments", []) or [], start=1):
-            attachment_lines.append(_format_msg_attachment_line(att, idx))
+        attachments = getattr(msg, "attachments", []) or []
 
         sections: list[str] = ["[Outlook MSG 邮件解析]"]
-        if class_type:
-            sections.append(f"消息类型: {class_type}")
-        if subject:
-            sections.append(f"主题: {subject}")
-        if sender:
-            sections.append(f"发件人: {sender}")
-        if to:
-            sections.append(f"收件人: {to}")
-        if cc:
-            sections.append(f"抄送: {cc}")
-        if date:
-            sections.append(f"时间: {date}")
-        if attachment_lines:
+        sections.extend(f"{label}: {value}" for label, value in headers if value)
+        if attachments:
             sections.append("附件列表:")
-            sections.extend(attachment_lines)
-        if body:
-            sections.append("\n--- 正文 ---\n")
-            sections.append(body)
-        else:
-            sections.append("\n--- 正文 ---\n")
-            sections.append("[未提取到可读正文：该邮件可能仅包含附件、图片或受限富文本内容]")
-
-        return truncate_text("\n".join(sections).strip(), max_chars)
+            sections.extend(_format_msg_attachment_line(att, idx) for idx, att in enumerate(attachments, start=1))
+        sections.append("\n--- 正文 ---\n")
+        # Body candidates are stripped in _extract_msg_body, so the joined text needs no final strip.
+        sections.append(body or "[未提取到可读正文：该邮件可能仅包含附件、图片或受限富文本内容]")
+
+        return truncate_text("\n".join(sections), max_chars)
     finally:
         close = getattr(msg, "close", None)
         if callable(close):
@@ -536,69 +666,140 @@ def _extract_outlook_msg(path: Path, max_chars: int) -> str:
                 pass
 
 
+def _unsupported_xls(path: Path, max_chars: int) -> str:
+    return "[暂不支持 .xls（二进制 Excel）直接解析，请先另存为 .xlsx 后再读取]"
+
+
+def _unsupported_ppt(path: Path, max_chars: int) -> str:
+    return "[暂不支持 .ppt（二进制 PowerPoint）直接解析，请先另存为 .pptx 后再读取]"
+
+
+_PLAIN_TEXT_SUFFIXES = (
+    ".txt",
+    ".md",
+    ".csv",
+    ".json",
+    ".log",
+    ".py",
+    ".js",
+    ".ts",
+    ".tsx",
+    ".html",
+    ".css",
+    ".yaml",
+    ".yml",
+)
+_DOCUMENT_HANDLERS: dict[str, Callable[[Path, int], str]] = {
+    **dict.fromkeys(_PLAIN_TEXT_SUFFIXES, _read_plain_text),
+    **dict.fromkeys((".atom", ".rss", ".xml"), _extract_xml_feed),
+    **dict.fromkeys(_XLSX_SUFFIXES, _extract_xlsx),
+    **dict.fromkeys(_PPTX_SUFFIXES, _extract_pptx),
+    ".pdf": _extract_pdf,
+    ".docx": _extract_docx,
+    ".xls": _unsupported_xls,
+    ".ppt": _unsupported_ppt,
+    ".msg": _extract_outlook_msg,
+}
+_SNIFFED_DOCUMENT_HANDLERS: dict[str | None, Callable[[Path, int], str]] = {
+    "xlsx": _extract_xlsx,
+    "pptx": _extract_pptx,
+    "msg": _extract_outlook_msg,
+}
+
+
+def _sniff_document_kind(path: Path) -> str | None:
+    """Classify a file with an unrecognized suffix from its content: "xlsx", "pptx", "msg" or None."""
+    try:
+        with path.open("rb") as fp:
+            magic = fp.read(len(_OLE2_MAGIC))
+            if magic == _OLE2_MAGIC:
+                head = magic + fp.read(_MSG_SNIFF_WINDOW_BYTES - len(magic))
+                return "msg" if looks_like_outlook_msg_bytes(head) else None
+    except OSError:
+        return None
+    if not magic.startswith(_ZIP_MAGIC):
+        return None
+    try:
+        with zipfile.ZipFile(path, "r") as zf:
+            if _zip_looks_like_xlsx(zf):
+                return "xlsx"
+            if _zip_looks_like_pptx(zf):
+                return "pptx"
+    except Exception:
+        return None
+    return None
+
+
+_EXTRACT_CACHE_MAX_ENTRIES = 32
+_EXTRACT_CACHE: OrderedDict[tuple[str, int, int, int], str] = OrderedDict()
+_EXTRACT_CACHE_LOCK = threading.Lock()
+
+
+def _cached_document_text(key: tuple[str, int, int, int]) -> str | None:
+    with _EXTRACT_CACHE_LOCK:
+        hit = _EXTRACT_CACHE.get(key)
+        if hit is not None:
+            _EXTRACT_CACHE.move_to_end(key)
+        return hit
+
+
+def _store_document_text(key: tuple[str, int, int, int], text: str) -> None:
+    with _EXTRACT_CACHE_LOCK:
+        _EXTRACT_CACHE[key] = text
+        _EXTRACT_CACHE.move_to_end(key)
+        while len(_EXTRACT_CACHE) > _EXTRACT_CACHE_MAX_ENTRIES:
+            _EXTRACT_CACHE.popitem(last=False)
+
+
 def extract_document_text(path: str, max_chars: int) -> str | None:
     file_path = Path(path)
     suffix = file_path.suffix.lower()
 
-    plain_suffixes = {
-        ".atom",
-        ".txt",
-        ".md",
-        ".csv",
-        ".json",
-        ".log",
-        ".py",
-        ".js",
-        ".ts",
-        ".tsx",
-        ".html",
-        ".css",
-        ".yaml",
-        ".yml",
-        ".xml",
-        ".rss",
-    }
+    # Failures are not cached so a retry can pick up a fixed environment.
+    try:
+        stat = file_path.stat()
+        key = (str(file_path), stat.st_mtime_ns, stat.st_size, int(max_chars))
+    except OSError:
+        key = None
+    if key is not None:
+        cached = _cached_document_text(key)
+        if cached is not None:
+            return cached
 
     try:
-        if suffix in {".atom", ".rss", ".xml"}:
-            return _extract_xml_feed(file_path, max_chars)
-        if suffix in plain_suffixes:
-            return _read_plain_text(file_path, max_chars)
-        if suffix == ".pdf":
-            return _extract_pdf(file_path, max_chars)
-        if suffix == ".docx":
-            return _extract_docx(file_path, max_chars)
-        if suffix in _XLSX_SUFFIXES:
-            return _extract_xlsx(file_path, max_chars)
-        if suffix in _PPTX_SUFFIXES:
-            return _extract_pptx(file_path, max_chars)
-        if suffix == ".xls":
-            return "[暂不支持 .xls（二进制 Excel）直接解析，请先另存为 .xlsx 后再读取]"
-        if suffix == ".ppt":
-            return "[暂不支持 .ppt（二进制 PowerPoint）直接解析，请先另存为 .pptx 后再读取]"
-        if suffix in {".zip", ".bin"} and looks_like_xlsx_file(file_path):
-            return _extract_xlsx(file_path, max_chars)
-        if suffix in {".zip", ".bin"} and looks_like_pptx_file(file_path):
-            return _extract_pptx(file_path, max_chars)
-        if suffix == ".msg" or looks_like_outlook_msg_file(file_path):
-            return _extract_outlook_msg(file_path, max_chars)
+        handler = _DOCUMENT_HANDLERS.get(suffix) or _SNIFFED_DOCUMENT_HANDLERS.get(_sniff_document_kind(file_path))
+        if handler is None:
+            return None
+        text = handler(file_path, max_chars)
     except Exception as exc:
         return f"[文档解析失败: {exc}]"
 
-    return None
+    if key is not None and text is not None:
+        _store_document_text(key, text)
+    return text
 
 
-def _heic_to_jpeg_bytes(path: Path) -> bytes:
-    try:
-        from PIL import Image
-        from pillow_heif import register_heif_opener
+_HEIC_JPEG_QUALITY = 85
+
 
-        register_heif_opener()
-        image = Image.open(path)
+def _heic_to_jpeg_bytes(path: Path) -> bytes | memoryview:
+    vips = _pyvips_module()
+    if vips is not None:
+        try:
+            image = vips.Image.new_from_file(str(path), access="sequential")
+            if image.interpretation != "srgb":
+                image = image.colourspace("srgb")
+            if image.hasalpha():
+                image = image.flatten()
+            return image.write_to_buffer(f".jpg[Q={_HEIC_JPEG_QUALITY}]")
+        except Exception:
+            pass
+    try:
+        image = _heif_image_module().open(path)
         rgb = image.convert("RGB")
         buffer = io.BytesIO()
-        rgb.save(buffer, format="JPEG", quality=92)
-        return buffer.getvalue()
+        rgb.save(buffer, format="JPEG", quality=_HEIC_JPEG_QUALITY)
+        return buffer.getbuffer()
     except Exception as exc:
         raise RuntimeError(
             "HEIC/HEIF conversion requires pillow-heif. Please install dependencies from requirements.txt."
@@ -635,14 +836,98 @@ def _normalize_image_mime(mime: str, suffix: str) -> str:
     return "image/png"
 
 
-def _image_to_png_bytes(path: Path) -> bytes:
-    from PIL import Image
-
-    with Image.open(path) as image:
+def _image_to_png_bytes(path: Path) -> bytes | memoryview:
+    with _pil_image_module().open(path) as image:
         converted = image.convert("RGBA" if "A" in image.getbands() else "RGB")
         buffer = io.BytesIO()
         converted.save(buffer, format="PNG", optimize=True)
-        return buffer.getvalue()
+        return buffer.getbuffer()
+
+
+_B64_STREAM_CHUNK_BYTES = 3 * 64 * 1024
+_MMAP_MIN_BYTES = 64 * 1024
+_DATA_URL_CACHE_MAX_ENTRIES = 64
+_DATA_URL_CACHE_MAX_CHARS = 64 * 1024 * 1024
+_DATA_URL_CACHE: OrderedDict[tuple[str, int, int, str], tuple[str, str | None]] = OrderedDict()
+_DATA_URL_CACHE_CHARS = 0
+_DATA_URL_CACHE_LOCK = threading.Lock()
+
+
+def _b64encode(raw: bytes | memoryview | mmap.mmap) -> bytes:
+    if pybase64 is not None:
+        return pybase64.b64encode(raw)
+    return base64.b64encode(raw)
+
+
+def _b64_stream(path: Path, chunk: int = _B64_STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    # Chunks stay 3-byte aligned so the pieces concatenate into one valid base64 payload.
+    pending = b""
+    with path.open("rb") as fp:
+        while True:
+            block = fp.read(chunk)
+            if not block:
+                break
+            if pending:
+                block = pending + block
+            cut = len(block) - len(block) % 3
+            pending = block[cut:]
+            if cut:
+                yield _b64encode(block[:cut])
+    if pending:
+        yield _b64encode(pending)
+
+
+def _data_url_from_bytes(out_mime: str, raw: bytes | memoryview) -> str:
+    buffer = bytearray(f"data:{out_mime};base64,".encode("ascii"))
+    buffer += _b64encode(raw)
+    return buffer.decode("ascii")
+
+
+def _data_url_from_file(out_mime: str, path: Path) -> str:
+    prefix = f"data:{out_mime};base64,".encode("ascii")
+    buffer = bytearray(prefix)
+    with path.open("rb") as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size <= 0:
+            raise RuntimeError("图片内容为空，无法编码为 data URL。")
+        if size < _MMAP_MIN_BYTES:
+            buffer += _b64encode(fp.read())
+            return buffer.decode("ascii")
+        try:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                buffer += _b64encode(mapped)
+            return buffer.decode("ascii")
+        except (OSError, ValueError):
+            pass
+    for piece in _b64_stream(path):
+        buffer += piece
+    if len(buffer) == len(prefix):
+        raise RuntimeError("图片内容为空，无法编码为 data URL。")
+    return buffer.decode("ascii")
+
+
+def _cached_data_url(key: tuple[str, int, int, str]) -> tuple[str, str | None] | None:
+    with _DATA_URL_CACHE_LOCK:
+        hit = _DATA_URL_CACHE.get(key)
+        if hit is not None:
+            _DATA_URL_CACHE.move_to_end(key)
+        return hit
+
+
+def _store_data_url(key: tuple[str, int, int, str], value: tuple[str, str | None]) -> None:
+    global _DATA_URL_CACHE_CHARS
+    size = len(value[0])
+    if size > _DATA_URL_CACHE_MAX_CHARS // 4:
+        return
+    with _DATA_URL_CACHE_LOCK:
+        previous = _DATA_URL_CACHE.pop(key, None)
+        if previous is not None:
+            _DATA_URL_CACHE_CHARS -= len(previous[0])
+        _DATA_URL_CACHE[key] = value
+        _DATA_URL_CACHE_CHARS += size
+        while _DATA_URL_CACHE_CHARS > _DATA_URL_CACHE_MAX_CHARS or len(_DATA_URL_CACHE) > _DATA_URL_CACHE_MAX_ENTRIES:
+            _, evicted = _DATA_URL_CACHE.popitem(last=False)
+            _DATA_URL_CACHE_CHARS -= len(evicted[0])
 
 
 def image_to_data_url_with_meta(path: str, mime: str) -> tuple[str, str | None]:
@@ -650,9 +935,23 @@ def image_to_data_url_with_meta(path: str, mime: str) -> tuple[str, str | None]:
     Returns (data_url, warning). For HEIC, fallback to original HEIC payload
     when local conversion is unavailable, so capable gateways can still consume it.
     """
-    file_path = Path(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return _build_image_data_url(Path(path), mime)
+    key = (str(path), stat.st_mtime_ns, stat.st_size, str(mime or ""))
+    cached = _cached_data_url(key)
+    if cached is not None:
+        return cached
+    result = _build_image_data_url(Path(path), mime)
+    _store_data_url(key, result)
+    return result
+
+
+def _build_image_data_url(file_path: Path, mime: str) -> tuple[str, str | None]:
     suffix = file_path.suffix.lower()
-    raw: bytes
+    # Converted images come back as views over the encoder's buffer, so no getvalue() copy is made.
+    raw: bytes | memoryview | None = None
     out_mime = _normalize_image_mime(mime, suffix)
     warning: str | None = None
 
@@ -662,7 +961,6 @@ def image_to_data_url_with_meta(path: str, mime: str) -> tuple[str, str | None]:
             raw = _heic_to_jpeg_bytes(file_path)
             out_mime = "image/jpeg"
         except Exception:
-            raw = file_path.read_bytes()
             out_mime = "image/heic"
             warning = "HEIC 未本地转码，已原始上传；若网关不支持 HEIC，请先转 JPG/PNG。"
     else:
@@ -674,14 +972,13 @@ def image_to_data_url_with_meta(path: str, mime: str) -> tuple[str, str | None]:
                 warning = f"检测到非标准图片类型({original_mime})，已转为 PNG 再发送。"
             except Exception as exc:
                 raise RuntimeError(f"不支持的图片类型({original_mime})，且转码失败: {exc}") from exc
-        else:
-            raw = file_path.read_bytes()
 
+    if raw is None:
+        return _data_url_from_file(out_mime, file_path), warning
     if not raw:
         raise RuntimeError("图片内容为空，无法编码为 data URL。")
 
-    encoded = base64.b64encode(raw).decode("ascii")
-    return f"data:{out_mime};base64,{encoded}", warning
+    return _data_url_from_bytes(out_mime, raw), warning
 
 
 def image_to_data_url(path: str, mime: str) -> str:
@@ -691,23 +988,24 @@ def image_to_data_url(path: str, mime: str) -> str:
 
 def summarize_file_payload(path: str, max_bytes: int = 768, max_text_chars: int = 1200) -> str:
     file_path = Path(path)
-    raw = file_path.read_bytes()
-    head = raw[:max_bytes]
+    # Only the head is previewed, so large uploads are never read in full.
+    with file_path.open("rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        head = handle.read(max_bytes)
 
     if not head:
         return "[空文件]"
 
-    text_bytes = b"\n\r\t\b\f" + bytes(range(32, 127))
-    non_text = sum(1 for b in head if b not in text_bytes)
+    non_text = len(head.translate(None, _TEXT_BYTES))
     is_binary = b"\x00" in head or (non_text / len(head)) > 0.30
 
     if not is_binary:
         text = head.decode("utf-8", errors="ignore")
         text = text[:max_text_chars]
-        return f"[文本预览，文件大小 {len(raw)} bytes]\\n{text}"
+        return f"[文本预览，文件大小 {size} bytes]\\n{text}"
 
-    hex_preview = " ".join(f"{b:02x}" for b in head[:128])
+    hex_preview = head[:128].hex(" ")
     return (
-        f"[二进制预览，文件大小 {len(raw)} bytes，前 {min(len(head),128)} bytes(hex)]\\n"
+        f"[二进制预览，文件大小 {size} bytes，前 {min(len(head),128)} bytes(hex)]\\n"
         f"{hex_preview}"
     )
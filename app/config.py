@@ -2,25 +2,29 @@ from __future__ import annotations
 
 import os
 import platform as py_platform
+import stat
+import sys
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
 
 def _split_csv(raw: str) -> list[str]:
-    return [item.strip() for item in raw.split(",") if item.strip()]
+    return [item for item in map(str.strip, raw.split(",")) if item]
 
 
 def _split_paths(raw: str) -> list[str]:
     if not raw:
         return []
     merged = raw.replace(",", os.pathsep)
-    return [item.strip() for item in merged.split(os.pathsep) if item.strip()]
+    return [item for item in map(str.strip, merged.split(os.pathsep)) if item]
 
 
 def _env(*keys: str, default: str | None = None) -> str | None:
     for key in keys:
-        if key in os.environ:
-            return os.environ.get(key)
+        value = os.environ.get(key)
+        if value is not None:
+            return value
     return default
 
 
@@ -28,51 +32,106 @@ def _env_is_set(*keys: str) -> bool:
     return any(key in os.environ for key in keys)
 
 
+# (AppConfig field, default, min, max); read from OFFICETOOL_<FIELD> / OFFCIATOOL_<FIELD> and clamped.
+_INT_SETTINGS: tuple[tuple[str, int, int, int], ...] = (
+    ("web_fetch_timeout_sec", 12, 3, 30),
+    ("web_fetch_max_chars", 120000, 2000, 500000),
+    ("codex_refresh_interval_days", 8, 1, 30),
+    ("model_cooldown_base_sec", 60, 10, 3600),
+    ("model_cooldown_max_sec", 3600, 60, 86400),
+    ("summary_trigger_turns", 2000, 6, 10000),
+    ("max_context_turns", 2000, 2, 2000),
+    ("max_attachment_chars", 1000000, 2000, 1000000),
+    ("max_upload_mb", 200, 1, 2048),
+    ("tool_result_soft_trim_chars", 40000, 2000, 1_000_000),
+    ("tool_result_hard_clear_chars", 180000, 4000, 2_000_000),
+    ("tool_result_head_chars", 8000, 500, 200_000),
+    ("tool_result_tail_chars", 4000, 500, 200_000),
+    ("tool_context_prune_keep_last", 3, 0, 20),
+    ("max_concurrent_runs", 2, 1, 32),
+    ("run_queue_wait_notice_ms", 1500, 0, 120_000),
+    ("pdf_workers", min(4, os.cpu_count() or 1), 1, 32),
+    ("docker_pids_limit", 256, 16, 4096),
+)
+
+
+def _env_int(field: str, default: int, lo: int, hi: int) -> int:
+    suffix = field.upper()
+    raw = _env(f"OFFICETOOL_{suffix}", f"OFFCIATOOL_{suffix}", default=str(default)) or str(default)
+    return max(lo, min(hi, int(raw.strip())))
+
+
 def _strip_optional_quotes(value: str) -> str:
     if len(value) >= 2 and ((value[0] == '"' and value[-1] == '"') or (value[0] == "'" and value[-1] == "'")):
         return value[1:-1]
     return value
 
 
+_DOTENV_OVERRIDE_PREFIXES = ("OFFICETOOL_", "OFFCIATOOL_")
+_DOTENV_OVERRIDE_KEYS = frozenset({"OPENAI_API_KEY", "OPENAI_BASE_URL", "SSL_CERT_FILE", "REQUESTS_CA_BUNDLE"})
+
+
 def _should_dotenv_override(key: str) -> bool:
-    normalized = key.strip().upper()
-    if normalized.startswith("OFFICETOOL_") or normalized.startswith("OFFCIATOOL_"):
-        return True
-    return normalized in {"OPENAI_API_KEY", "OPENAI_BASE_URL", "SSL_CERT_FILE", "REQUESTS_CA_BUNDLE"}
+    normalized = key if key.isupper() else key.upper()
+    return normalized.startswith(_DOTENV_OVERRIDE_PREFIXES) or normalized in _DOTENV_OVERRIDE_KEYS
 
 
-def _load_dotenv_if_present() -> None:
-    candidates = [
-        (Path.cwd() / ".env").resolve(),
-        (Path(__file__).resolve().parent.parent / ".env").resolve(),
-    ]
+_DOTENV_CACHE: dict[str, tuple[int, list[tuple[str, str]]]] = {}
 
-    seen: set[str] = set()
-    for dotenv_path in candidates:
-        key = str(dotenv_path)
-        if key in seen or not dotenv_path.is_file():
-            continue
-        seen.add(key)
 
-        for raw_line in dotenv_path.read_text(encoding="utf-8").splitlines():
+def _parse_dotenv(dotenv_path: Path) -> list[tuple[str, str]]:
+    pairs: list[tuple[str, str]] = []
+    with dotenv_path.open("r", encoding="utf-8") as handle:
+        for raw_line in handle:
             line = raw_line.strip().lstrip("\ufeff")
             if not line or line.startswith("#"):
                 continue
             if line.startswith("export "):
                 line = line[7:].strip()
-            if "=" not in line:
+            env_key, sep, env_value = line.partition("=")
+            if not sep:
                 continue
-
-            env_key, env_value = line.split("=", 1)
             env_key = env_key.strip()
             env_value = env_value.strip()
             if not env_key:
                 continue
 
             env_value = _strip_optional_quotes(env_value)
-            if " #" in env_value:
-                env_value = env_value.split(" #", 1)[0].rstrip()
+            head, sep, _ = env_value.partition(" #")
+            if sep:
+                env_value = head.rstrip()
+            pairs.append((env_key, env_value))
+    return pairs
 
+
+_PROJECT_DOTENV_PATH = Path(__file__).resolve().parent.parent / ".env"
+
+
+def _load_dotenv_if_present() -> None:
+    candidates = [Path.cwd() / ".env", _PROJECT_DOTENV_PATH]
+
+    seen: set[str] = set()
+    for candidate in candidates:
+        try:
+            info = candidate.stat()
+        except OSError:
+            continue
+        if not stat.S_ISREG(info.st_mode):
+            continue
+        dotenv_path = candidate.resolve()
+        key = str(dotenv_path)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        # Re-parse only when the file changed; the assignments are still replayed so that
+        # overrides win again after a reload_config().
+        cached = _DOTENV_CACHE.get(key)
+        if cached is None or cached[0] != info.st_mtime_ns:
+            cached = (info.st_mtime_ns, _parse_dotenv(dotenv_path))
+            _DOTENV_CACHE[key] = cached
+
+        for env_key, env_value in cached[1]:
             if _should_dotenv_override(env_key):
                 os.environ[env_key] = env_value
             else:
@@ -135,6 +194,7 @@ class AppConfig:
     tool_context_prune_keep_last: int
     max_concurrent_runs: int
     run_queue_wait_notice_ms: int
+    pdf_workers: int
     execution_mode: str
     docker_bin: str
     docker_image: str
@@ -225,7 +285,16 @@ def _default_extra_allowed_roots_for_platform(home: Path) -> tuple[str, list[Pat
     return platform_name, deduped
 
 
+def _ensure_dirs(*paths: Path) -> None:
+    for path in dict.fromkeys(paths):
+        if not path.is_dir():
+            path.mkdir(parents=True, exist_ok=True)
+
+
+@lru_cache(maxsize=1)
 def load_config() -> AppConfig:
+    # Built once per process: the dotenv read, path resolution and mkdirs below are all
+    # filesystem work. Use reload_config() after changing the environment.
     _load_dotenv_if_present()
 
     workspace_root = Path(_env("OFFICETOOL_WORKSPACE_ROOT", "OFFCIATOOL_WORKSPACE_ROOT", default=os.getcwd()) or os.getcwd()).resolve()
@@ -342,15 +411,17 @@ def load_config() -> AppConfig:
         or str(workspace_root / "app" / "data" / "shadow_logs")
     ).resolve()
 
-    modules_dir.mkdir(parents=True, exist_ok=True)
-    runtime_dir.mkdir(parents=True, exist_ok=True)
-    evolution_dir.mkdir(parents=True, exist_ok=True)
-    sessions_dir.mkdir(parents=True, exist_ok=True)
-    uploads_dir.mkdir(parents=True, exist_ok=True)
-    token_stats_path.parent.mkdir(parents=True, exist_ok=True)
-    shadow_logs_dir.mkdir(parents=True, exist_ok=True)
-    overlay_profile_path.parent.mkdir(parents=True, exist_ok=True)
-    evolution_logs_dir.mkdir(parents=True, exist_ok=True)
+    _ensure_dirs(
+        modules_dir,
+        runtime_dir,
+        evolution_dir,
+        sessions_dir,
+        uploads_dir,
+        token_stats_path.parent,
+        shadow_logs_dir,
+        overlay_profile_path.parent,
+        evolution_logs_dir,
+    )
 
     allowed_commands_raw = _env(
         "OFFICETOOL_ALLOWED_COMMANDS",
@@ -366,6 +437,7 @@ def load_config() -> AppConfig:
     ).strip().lower()
     if openai_auth_mode not in {"auto", "api_key", "codex_auth"}:
         openai_auth_mode = "auto"
+    openai_auth_mode = sys.intern(openai_auth_mode)
     codex_home = Path(
         _env(
             "OFFICETOOL_CODEX_HOME",
@@ -409,16 +481,6 @@ def load_config() -> AppConfig:
         )
         or "app_EMoamEEZ73f0CkXaXp7hrann"
     ).strip()
-    codex_refresh_interval_days = int(
-        (
-            _env(
-                "OFFICETOOL_CODEX_REFRESH_INTERVAL_DAYS",
-                "OFFCIATOOL_CODEX_REFRESH_INTERVAL_DAYS",
-                default="8",
-            )
-            or "8"
-        ).strip()
-    )
     openai_ca_cert_path = (
         _env("OFFICETOOL_CA_CERT_PATH", "OFFCIATOOL_CA_CERT_PATH", "SSL_CERT_FILE", default="") or ""
     ).strip() or None
@@ -440,26 +502,6 @@ def load_config() -> AppConfig:
     model_fallbacks = _split_csv(
         _env("OFFICETOOL_MODEL_FALLBACKS", "OFFCIATOOL_MODEL_FALLBACKS", default="") or ""
     )
-    model_cooldown_base_sec = int(
-        (
-            _env(
-                "OFFICETOOL_MODEL_COOLDOWN_BASE_SEC",
-                "OFFCIATOOL_MODEL_COOLDOWN_BASE_SEC",
-                default="60",
-            )
-            or "60"
-        ).strip()
-    )
-    model_cooldown_max_sec = int(
-        (
-            _env(
-                "OFFICETOOL_MODEL_COOLDOWN_MAX_SEC",
-                "OFFCIATOOL_MODEL_COOLDOWN_MAX_SEC",
-                default="3600",
-            )
-            or "3600"
-        ).strip()
-    )
 
     allow_any_raw = (_env("OFFICETOOL_ALLOW_ANY_PATH", "OFFCIATOOL_ALLOW_ANY_PATH", default="false") or "false").strip().lower()
     allow_any_path = allow_any_raw in {"1", "true", "yes", "on"}
@@ -485,12 +527,6 @@ def load_config() -> AppConfig:
     web_allowed_domains = _split_csv(web_domains_raw)
     web_allow_all_domains = len(web_allowed_domains) == 0
 
-    web_fetch_timeout_sec = int(
-        (_env("OFFICETOOL_WEB_FETCH_TIMEOUT_SEC", "OFFCIATOOL_WEB_FETCH_TIMEOUT_SEC", default="12") or "12").strip()
-    )
-    web_fetch_max_chars = int(
-        (_env("OFFICETOOL_WEB_FETCH_MAX_CHARS", "OFFCIATOOL_WEB_FETCH_MAX_CHARS", default="120000") or "120000").strip()
-    )
     web_skip_tls_verify_raw = (
         _env("OFFICETOOL_WEB_SKIP_TLS_VERIFY", "OFFCIATOOL_WEB_SKIP_TLS_VERIFY", default="false") or "false"
     ).strip().lower()
@@ -513,77 +549,12 @@ def load_config() -> AppConfig:
         seen.add(key)
         allowed_roots.append(root)
 
-    tool_result_soft_trim_chars = int(
-        (
-            _env(
-                "OFFICETOOL_TOOL_RESULT_SOFT_TRIM_CHARS",
-                "OFFCIATOOL_TOOL_RESULT_SOFT_TRIM_CHARS",
-                default="40000",
-            )
-            or "40000"
-        ).strip()
-    )
-    tool_result_hard_clear_chars = int(
-        (
-            _env(
-                "OFFICETOOL_TOOL_RESULT_HARD_CLEAR_CHARS",
-                "OFFCIATOOL_TOOL_RESULT_HARD_CLEAR_CHARS",
-                default="180000",
-            )
-            or "180000"
-        ).strip()
-    )
-    tool_result_head_chars = int(
-        (
-            _env(
-                "OFFICETOOL_TOOL_RESULT_HEAD_CHARS",
-                "OFFCIATOOL_TOOL_RESULT_HEAD_CHARS",
-                default="8000",
-            )
-            or "8000"
-        ).strip()
-    )
-    tool_result_tail_chars = int(
-        (
-            _env(
-                "OFFICETOOL_TOOL_RESULT_TAIL_CHARS",
-                "OFFCIATOOL_TOOL_RESULT_TAIL_CHARS",
-                default="4000",
-            )
-            or "4000"
-        ).strip()
-    )
-    tool_context_prune_keep_last = int(
-        (
-            _env(
-                "OFFICETOOL_TOOL_CONTEXT_PRUNE_KEEP_LAST",
-                "OFFCIATOOL_TOOL_CONTEXT_PRUNE_KEEP_LAST",
-                default="3",
-            )
-            or "3"
-        ).strip()
-    )
-    max_concurrent_runs = int(
-        (
-            _env("OFFICETOOL_MAX_CONCURRENT_RUNS", "OFFCIATOOL_MAX_CONCURRENT_RUNS", default="2")
-            or "2"
-        ).strip()
-    )
-    run_queue_wait_notice_ms = int(
-        (
-            _env(
-                "OFFICETOOL_RUN_QUEUE_WAIT_NOTICE_MS",
-                "OFFCIATOOL_RUN_QUEUE_WAIT_NOTICE_MS",
-                default="1500",
-            )
-            or "1500"
-        ).strip()
-    )
     execution_mode = (
         _env("OFFICETOOL_EXECUTION_MODE", "OFFCIATOOL_EXECUTION_MODE", default="host") or "host"
     ).strip().lower()
     if execution_mode not in {"host", "docker"}:
         execution_mode = "host"
+    execution_mode = sys.intern(execution_mode)
     docker_bin = (
         _env("OFFICETOOL_DOCKER_BIN", "OFFCIATOOL_DOCKER_BIN", default="docker") or "docker"
     ).strip()
@@ -600,9 +571,6 @@ def load_config() -> AppConfig:
     docker_cpus = (
         _env("OFFICETOOL_DOCKER_CPUS", "OFFCIATOOL_DOCKER_CPUS", default="1.0") or "1.0"
     ).strip()
-    docker_pids_limit = int(
-        (_env("OFFICETOOL_DOCKER_PIDS_LIMIT", "OFFCIATOOL_DOCKER_PIDS_LIMIT", default="256") or "256").strip()
-    )
     docker_container_prefix = (
         _env("OFFICETOOL_DOCKER_CONTAINER_PREFIX", "OFFCIATOOL_DOCKER_CONTAINER_PREFIX", default="officetool-sbx")
         or "officetool-sbx"
@@ -639,8 +607,6 @@ def load_config() -> AppConfig:
         allow_any_path=allow_any_path,
         web_allowed_domains=web_allowed_domains,
         web_allow_all_domains=web_allow_all_domains,
-        web_fetch_timeout_sec=max(3, min(30, web_fetch_timeout_sec)),
-        web_fetch_max_chars=max(2000, min(500000, web_fetch_max_chars)),
         web_skip_tls_verify=web_skip_tls_verify,
         web_ca_cert_path=web_ca_cert_path,
         openai_auth_mode=openai_auth_mode,
@@ -653,13 +619,10 @@ def load_config() -> AppConfig:
         codex_chatgpt_base_url=codex_chatgpt_base_url or "https://chatgpt.com/backend-api/codex",
         codex_refresh_url=codex_refresh_url or "https://auth.openai.com/oauth/token",
         codex_client_id=codex_client_id or "app_EMoamEEZ73f0CkXaXp7hrann",
-        codex_refresh_interval_days=max(1, min(30, codex_refresh_interval_days)),
         default_model=(
             _env("OFFICETOOL_DEFAULT_MODEL", "OFFCIATOOL_DEFAULT_MODEL", default="gpt-5.1-chat") or "gpt-5.1-chat"
         ),
         model_fallbacks=model_fallbacks,
-        model_cooldown_base_sec=max(10, min(3600, model_cooldown_base_sec)),
-        model_cooldown_max_sec=max(60, min(86400, model_cooldown_max_sec)),
         summary_model=(
             _env(
                 "OFFICETOOL_SUMMARY_MODEL",
@@ -672,53 +635,20 @@ def load_config() -> AppConfig:
         ),
         system_prompt=_env("OFFICETOOL_SYSTEM_PROMPT", "OFFCIATOOL_SYSTEM_PROMPT", default=DEFAULT_SYSTEM_PROMPT)
         or DEFAULT_SYSTEM_PROMPT,
-        summary_trigger_turns=max(
-            6,
-            min(
-                10000,
-                int(
-                    _env("OFFICETOOL_SUMMARY_TRIGGER_TURNS", "OFFCIATOOL_SUMMARY_TRIGGER_TURNS", default="2000")
-                    or "2000"
-                ),
-            ),
-        ),
-        max_context_turns=max(
-            2,
-            min(
-                2000,
-                int(_env("OFFICETOOL_MAX_CONTEXT_TURNS", "OFFCIATOOL_MAX_CONTEXT_TURNS", default="2000") or "2000"),
-            ),
-        ),
-        max_attachment_chars=max(
-            2000,
-            min(
-                1000000,
-                int(
-                    _env("OFFICETOOL_MAX_ATTACHMENT_CHARS", "OFFCIATOOL_MAX_ATTACHMENT_CHARS", default="1000000")
-                    or "1000000"
-                ),
-            ),
-        ),
-        max_upload_mb=max(
-            1,
-            min(2048, int(_env("OFFICETOOL_MAX_UPLOAD_MB", "OFFCIATOOL_MAX_UPLOAD_MB", default="200") or "200")),
-        ),
-        tool_result_soft_trim_chars=max(2000, min(1_000_000, tool_result_soft_trim_chars)),
-        tool_result_hard_clear_chars=max(4000, min(2_000_000, tool_result_hard_clear_chars)),
-        tool_result_head_chars=max(500, min(200_000, tool_result_head_chars)),
-        tool_result_tail_chars=max(500, min(200_000, tool_result_tail_chars)),
-        tool_context_prune_keep_last=max(0, min(20, tool_context_prune_keep_last)),
-        max_concurrent_runs=max(1, min(32, max_concurrent_runs)),
-        run_queue_wait_notice_ms=max(0, min(120_000, run_queue_wait_notice_ms)),
         execution_mode=execution_mode,
         docker_bin=docker_bin or "docker",
         docker_image=docker_image or "python:3.11-slim",
-        docker_network=docker_network or "none",
+        docker_network=sys.intern(docker_network or "none"),
         docker_memory=docker_memory or "2g",
         docker_cpus=docker_cpus or "1.0",
-        docker_pids_limit=max(16, min(4096, docker_pids_limit)),
         docker_container_prefix=docker_container_prefix or "officetool-sbx",
         enable_session_tools=enable_session_tools,
         enable_shadow_logging=enable_shadow_logging,
         allowed_commands=_split_csv(allowed_commands_raw),
+        **{field: _env_int(field, default, lo, hi) for field, default, lo, hi in _INT_SETTINGS},
     )
+
+
+def reload_config() -> AppConfig:
+    load_config.cache_clear()
+    return load_config()
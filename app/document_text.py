@@ -1,22 +1,41 @@
 from __future__ import annotations
 
+import importlib.util
 import io
 import json
+import logging
+import multiprocessing
 import os
 import re
 import tempfile
+import threading
 from hashlib import sha256
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
+from typing import Any, Callable, Iterator, Sequence
 
 
 _DOC_CACHE_VERSION = "pdf-pages-v1"
 _DOC_CACHE_DIR = (Path(__file__).resolve().parent / "data" / "document_cache").resolve()
+_PDF_PARALLEL_MIN_PAGES = 16
+_PDF_WORKERS = 1
+_PDF_PROCESS_POOL: ProcessPoolExecutor | None = None
+_PDF_PROCESS_POOL_LOCK = threading.Lock()
 
+logger = logging.getLogger(__name__)
 
-def truncate_text(text: str, max_chars: int) -> str:
-    if len(text) <= max_chars:
+
+def truncate_text(text: str, max_chars: int, *, source_bytes: int | None = None) -> str:
+    # `source_bytes` marks text read from a bounded window of a larger file: the full char count is
+    # unknown, so the banner reports the source size instead and truncation always applies.
+    if source_bytes is None and len(text) <= max_chars:
         return text
     keep = max_chars - 64
+    if source_bytes is not None:
+        return f"{text[:keep]}\n\n[内容已截断，原始大小 {source_bytes} 字节]"
     return f"{text[:keep]}\n\n[内容已截断，原始长度 {len(text)} 字符]"
 
 
@@ -168,19 +187,89 @@ def extract_heading_entries_from_pages(
     return headings
 
 
-def _pdfplumber_page_texts(raw_pdf: bytes) -> list[tuple[int, str]]:
-    import pdfplumber  # lazy import
+def _pdf_open_source(source: Path | bytes) -> Path | io.BytesIO:
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _numbered_pages(pages: Sequence[Any], page_range: range | None) -> Iterator[tuple[int, Any]]:
+    for offset in page_range if page_range is not None else range(len(pages)):
+        yield offset + 1, pages[offset]
+
+
+def _parallel_page_ranges(source: Path | bytes, page_range: range | None, page_count: int) -> list[range]:
+    # Only whole documents on disk are split: workers reopen the file from its path, so PDF bytes
+    # are never pickled across processes, and a worker's own range request never splits again.
+    if page_range is not None or not isinstance(source, Path) or page_count < _PDF_PARALLEL_MIN_PAGES:
+        return []
+    workers = min(_PDF_WORKERS, page_count // (_PDF_PARALLEL_MIN_PAGES // 2))
+    if workers <= 1:
+        return []
+    step = -(-page_count // workers)
+    return [range(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+def set_pdf_worker_count(workers: int) -> None:
+    global _PDF_WORKERS
+    _PDF_WORKERS = max(1, int(workers))
+    with _PDF_PROCESS_POOL_LOCK:
+        pool = _PDF_PROCESS_POOL
+    if pool is not None:
+        _discard_pdf_process_pool(pool)
+
+
+def _pdf_process_pool() -> ProcessPoolExecutor:
+    global _PDF_PROCESS_POOL
+    with _PDF_PROCESS_POOL_LOCK:
+        if _PDF_PROCESS_POOL is None:
+            _PDF_PROCESS_POOL = ProcessPoolExecutor(
+                max_workers=_PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _PDF_PROCESS_POOL
+
+
+def _discard_pdf_process_pool(pool: ProcessPoolExecutor) -> None:
+    global _PDF_PROCESS_POOL
+    with _PDF_PROCESS_POOL_LOCK:
+        if _PDF_PROCESS_POOL is pool:
+            _PDF_PROCESS_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
 
+
+def _map_pdf_page_ranges(
+    extractor: Callable[[Path, range | None], list[tuple[int, str]]],
+    path: Path,
+    ranges: list[range],
+) -> list[tuple[int, str]]:
+    # pdfplumber/pypdf parse pages in pure Python, so contiguous page ranges go to a shared
+    # spawn pool that is created on first use and reused across documents.
+    pool = _pdf_process_pool()
+    try:
+        parts = list(pool.map(extractor, repeat(path, len(ranges)), ranges))
+    except (BrokenProcessPool, OSError):
+        logger.warning("PDF worker pool failed for %s; extracting pages serially", path, exc_info=True)
+        _discard_pdf_process_pool(pool)
+        parts = [extractor(path, page_range) for page_range in ranges]
+    return [page for part in parts for page in part]
+
+
+def _pymupdf_page_texts(source: Path | bytes, page_range: range | None = None) -> list[tuple[int, str]]:
+    import pymupdf  # lazy import
+
+    # PyMuPDF parses in C and is fast enough serially; it never goes through the process pool.
     pages: list[tuple[int, str]] = []
-    with pdfplumber.open(io.BytesIO(raw_pdf)) as pdf:
-        for idx, page in enumerate(pdf.pages, start=1):
-            text = (page.extract_text(layout=True) or "").strip()
+    opened = pymupdf.open(stream=source, filetype="pdf") if isinstance(source, bytes) else pymupdf.open(str(source))
+    with opened as doc:
+        for idx, page in _numbered_pages(doc, page_range):
+            text = (page.get_text("text") or "").strip()
             table_lines: list[str] = []
-            try:
-                for table in page.extract_tables() or []:
-                    table_lines.extend(_table_to_lines(table))
-            except Exception:
-                table_lines = []
+            find_tables = getattr(page, "find_tables", None)
+            if callable(find_tables):
+                try:
+                    for table in find_tables().tables:
+                        table_lines.extend(_table_to_lines(table.extract()))
+                except Exception:
+                    table_lines = []
 
             body_parts: list[str] = []
             if text:
@@ -194,23 +283,90 @@ def _pdfplumber_page_texts(raw_pdf: bytes) -> list[tuple[int, str]]:
     return pages
 
 
-def _pypdf_page_texts(raw_pdf: bytes) -> list[tuple[int, str]]:
-    from pypdf import PdfReader  # lazy import
+def _pdfplumber_page_bodies(pages: Sequence[Any], page_range: range | None) -> Iterator[tuple[int, str]]:
+    for idx, page in _numbered_pages(pages, page_range):
+        text = (page.extract_text(layout=True) or "").strip()
+        table_lines: list[str] = []
+        try:
+            for table in page.extract_tables() or []:
+                table_lines.extend(_table_to_lines(table))
+        except Exception:
+            table_lines = []
+
+        body_parts: list[str] = []
+        if text:
+            body_parts.append(text)
+        if table_lines:
+            body_parts.append("[Extracted tables]")
+            body_parts.extend(table_lines)
+        body = "\n".join(body_parts).strip()
+        if body:
+            yield idx, body
 
-    reader = PdfReader(io.BytesIO(raw_pdf))
-    pages: list[tuple[int, str]] = []
-    for idx, page in enumerate(reader.pages, start=1):
+
+def _iter_pdfplumber_page_texts(source: Path | bytes, page_range: range | None = None) -> Iterator[tuple[int, str]]:
+    import pdfplumber  # lazy import
+
+    with pdfplumber.open(_pdf_open_source(source)) as pdf:
+        yield from _pdfplumber_page_bodies(pdf.pages, page_range)
+
+
+def _pdfplumber_page_texts(source: Path | bytes, page_range: range | None = None) -> list[tuple[int, str]]:
+    import pdfplumber  # lazy import
+
+    with pdfplumber.open(_pdf_open_source(source)) as pdf:
+        ranges = _parallel_page_ranges(source, page_range, len(pdf.pages))
+        if not ranges:
+            return list(_pdfplumber_page_bodies(pdf.pages, page_range))
+    return _map_pdf_page_ranges(_pdfplumber_page_texts, source, ranges)
+
+
+def _pypdf_page_bodies(pages: Sequence[Any], page_range: range | None) -> Iterator[tuple[int, str]]:
+    for idx, page in _numbered_pages(pages, page_range):
         body = (page.extract_text() or "").strip()
         if body:
-            pages.append((idx, body))
-    return pages
+            yield idx, body
 
 
-def extract_pdf_page_texts_from_bytes(raw_pdf: bytes) -> list[tuple[int, str]]:
+def _iter_pypdf_page_texts(source: Path | bytes, page_range: range | None = None) -> Iterator[tuple[int, str]]:
+    from pypdf import PdfReader  # lazy import
+
+    yield from _pypdf_page_bodies(PdfReader(_pdf_open_source(source)).pages, page_range)
+
+
+def _pypdf_page_texts(source: Path | bytes, page_range: range | None = None) -> list[tuple[int, str]]:
+    from pypdf import PdfReader  # lazy import
+
+    pages = PdfReader(_pdf_open_source(source)).pages
+    ranges = _parallel_page_ranges(source, page_range, len(pages))
+    if not ranges:
+        return list(_pypdf_page_bodies(pages, page_range))
+    return _map_pdf_page_ranges(_pypdf_page_texts, source, ranges)
+
+
+_PDF_PAGE_EXTRACTORS = (
+    ("pymupdf", _pymupdf_page_texts),
+    ("pdfplumber", _pdfplumber_page_texts),
+    ("pypdf", _pypdf_page_texts),
+)
+
+
+@lru_cache(maxsize=None)
+def _module_available(name: str) -> bool:
+    # PyMuPDF is an optional extra; absent parsers are skipped without attempting the import.
+    return importlib.util.find_spec(name) is not None
+
+
+def _extract_pdf_page_texts(source: Path | bytes) -> list[tuple[int, str]]:
     errors: list[str] = []
-    for extractor in (_pdfplumber_page_texts, _pypdf_page_texts):
+    # PyMuPDF parses in C and is several times faster than pdfplumber; when it is not installed
+    # the pure-Python extractors are used.
+    for module_name, extractor in _PDF_PAGE_EXTRACTORS:
+        if not _module_available(module_name):
+            errors.append(f"{extractor.__name__}: {module_name} is not installed")
+            continue
         try:
-            pages = extractor(raw_pdf)
+            pages = extractor(source)
         except Exception as exc:
             errors.append(f"{extractor.__name__}: {exc}")
             continue
@@ -222,11 +378,15 @@ def extract_pdf_page_texts_from_bytes(raw_pdf: bytes) -> list[tuple[int, str]]:
     return []
 
 
+def extract_pdf_page_texts_from_bytes(raw_pdf: bytes) -> list[tuple[int, str]]:
+    return _extract_pdf_page_texts(raw_pdf)
+
+
 def extract_pdf_page_texts_from_path(path: Path) -> list[tuple[int, str]]:
     cached = _read_cached_pdf_pages(path)
     if cached is not None:
         return cached
-    pages = extract_pdf_page_texts_from_bytes(path.read_bytes())
+    pages = _extract_pdf_page_texts(path)
     if pages:
         _write_cached_pdf_pages(path, pages)
     return pages
@@ -236,7 +396,8 @@ def _extract_pdf_with_pdfplumber(raw_pdf: bytes, max_chars: int) -> str:
     chunks: list[str] = []
     total = 0
     limit = max(512, int(max_chars))
-    for idx, body in _pdfplumber_page_texts(raw_pdf):
+    # Pages are parsed lazily, so extraction stops once the char budget is reached.
+    for idx, body in _iter_pdfplumber_page_texts(raw_pdf):
         total, reached = _append_page_block(chunks, idx, body, total, limit)
         if reached:
             break
@@ -247,7 +408,7 @@ def _extract_pdf_with_pypdf(raw_pdf: bytes, max_chars: int) -> str:
     chunks: list[str] = []
     total = 0
     limit = max(512, int(max_chars))
-    for idx, body in _pypdf_page_texts(raw_pdf):
+    for idx, body in _iter_pypdf_page_texts(raw_pdf):
         total, reached = _append_page_block(chunks, idx, body, total, limit)
         if reached:
             break
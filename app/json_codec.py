@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional speedup, stdlib json is the fallback
+    orjson = None
+
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def dumps_json(obj: Any, *, default: Callable[[Any], Any] | None = str) -> str:
+    # Tool results can reach hundreds of KB; orjson encodes them several times faster than stdlib json.
+    # orjson writes datetime/date/UUID/dataclass/numpy values natively; other objects (Path, ...)
+    # go through `default`. Anything orjson still rejects (lone surrogates, >64-bit ints) is
+    # retried with stdlib json.
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, default=default)
@@ -3,6 +3,9 @@ from __future__ import annotations
 import json
 import fnmatch
 import hashlib
+import heapq
+import locale
+import os
 import re
 import shlex
 import shutil
@@ -15,6 +18,7 @@ import urllib.parse
 import urllib.request
 import xml.etree.ElementTree as ET
 import zipfile
+from functools import lru_cache
 from html import unescape
 from pathlib import Path
 from typing import Any
@@ -38,13 +42,41 @@ def _is_within(path: Path, root: Path) -> bool:
     return path == root or root in path.parents
 
 
+@lru_cache(maxsize=8)
+def _allowed_root_aliases(roots: tuple[Path, ...]) -> tuple[tuple[Path, str, str, str, str, str, str], ...]:
+    # Pure string work per allowed root, so it is computed once per root set rather than per path lookup.
+    aliases = []
+    for root in roots:
+        name = root.name.lower()
+        parent_name = root.parent.name.lower()
+        aliases.append(
+            (
+                root,
+                str(root).replace("\\", "/").rstrip("/").lower(),
+                name,
+                f"{name}/",
+                parent_name,
+                f"{parent_name}/",
+                f"{parent_name}/{name}",
+            )
+        )
+    return tuple(aliases)
+
+
 def _build_path_candidates(config: AppConfig, raw_path: str) -> list[Path]:
     raw = (raw_path or ".").strip() or "."
     path = Path(raw).expanduser()
     seen: set[str] = set()
+    seen_unresolved: set[str] = set()
     candidates: list[Path] = []
 
     def add(p: Path) -> None:
+        # Identical unresolved paths resolve identically, so repeats skip the realpath walk. No
+        # normpath here: collapsing "link/.." would be wrong when "link" is a symlink.
+        raw_key = str(p)
+        if raw_key in seen_unresolved:
+            return
+        seen_unresolved.add(raw_key)
         resolved = p.resolve()
         key = str(resolved)
         if key in seen:
@@ -61,31 +93,28 @@ def _build_path_candidates(config: AppConfig, raw_path: str) -> list[Path]:
     if normalized:
         # High-priority alias mapping, e.g. "workbench/a.txt" -> "<allowed_root_named_workbench>/a.txt"
         # Also support short aliases from allowed root tails, e.g. "master/source" -> "<...>/master/source".
-        for root in config.allowed_roots:
-            root_norm = str(root).replace("\\", "/").rstrip("/").lower()
-            if normalized == root_norm or normalized == root.name.lower():
+        for root, root_norm, name, prefix, parent_name, parent_prefix, parent_child in _allowed_root_aliases(
+            tuple(config.allowed_roots)
+        ):
+            if normalized == root_norm or normalized == name:
                 add(root)
                 continue
-            prefix = f"{root.name.lower()}/"
             if normalized.startswith(prefix):
                 suffix = normalized_slash[len(prefix) :]
                 add(root / suffix)
 
-            parent_name = root.parent.name.lower()
             if parent_name:
                 if normalized == parent_name:
                     add(root)
-                parent_prefix = f"{parent_name}/"
                 if normalized.startswith(parent_prefix):
                     suffix = normalized_slash[len(parent_prefix) :]
-                    if suffix == root.name.lower():
+                    if suffix == name:
                         add(root)
-                    elif suffix.startswith(f"{root.name.lower()}/"):
+                    elif suffix.startswith(prefix):
                         add(root / suffix[len(root.name) + 1 :])
                     else:
                         add(root / suffix)
 
-                parent_child = f"{parent_name}/{root.name.lower()}"
                 if normalized == parent_child:
                     add(root)
                 parent_child_prefix = f"{parent_child}/"
@@ -182,6 +211,60 @@ def _truncate_output(text: str, max_chars: int = 12000) -> str:
     return f"{text[:max_chars]}\n\n[output truncated: {len(text)} chars]"
 
 
+def _drain_capped(stream: Any, keep_bytes: int, result: list[Any]) -> None:
+    # The pipe is always drained so the child never blocks, but only the head is kept.
+    head = bytearray()
+    total = 0
+    try:
+        while True:
+            chunk = stream.read(64 * 1024)
+            if not chunk:
+                break
+            total += len(chunk)
+            if len(head) < keep_bytes:
+                head += chunk[: keep_bytes - len(head)]
+    finally:
+        stream.close()
+    result.extend((bytes(head), total))
+
+
+def _decode_capped_output(head: bytes, total: int, max_chars: int = 12000) -> str:
+    # text=True used universal newlines; keep "\r\n" and "\r" from leaking into tool output.
+    text = head.decode(locale.getpreferredencoding(False), errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+    if total <= len(head) and len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}\n\n[output truncated: {total} bytes]"
+
+
+def _run_host_command(argv: list[str], cwd: Path, timeout_sec: int, max_chars: int = 12000) -> tuple[int, str, str]:
+    # Commands like rg can emit megabytes; keep enough bytes for max_chars of any encoding and
+    # count the rest, instead of buffering and decoding all of it like capture_output/text did.
+    keep_bytes = max_chars * 4
+    with subprocess.Popen(argv, cwd=str(cwd), stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        results: tuple[list[Any], list[Any]] = ([], [])
+        readers = [
+            threading.Thread(target=_drain_capped, args=(stream, keep_bytes, result), daemon=True)
+            for stream, result in zip((proc.stdout, proc.stderr), results)
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            returncode = proc.wait(timeout=timeout_sec)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            for reader in readers:
+                reader.join(timeout=5)
+    (out_head, out_total), (err_head, err_total) = (result or (b"", 0) for result in results)
+    return (
+        returncode,
+        _decode_capped_output(out_head, out_total, max_chars),
+        _decode_capped_output(err_head, err_total, max_chars),
+    )
+
+
 def _looks_like_html(content_type: str, text: str) -> bool:
     lower_ct = (content_type or "").lower()
     if "text/html" in lower_ct or "application/xhtml+xml" in lower_ct:
@@ -190,17 +273,18 @@ def _looks_like_html(content_type: str, text: str) -> bool:
     return "<html" in head or "<!doctype html" in head
 
 
+# Line breaks are placed first; one alternation then drops comments, script/style/noscript
+# bodies and remaining tags in a single left-to-right scan.
+_HTML_LINE_BREAK_RE = re.compile(r"(?i)<br\s*/?>|</(?:p|div|li|tr|h1|h2|h3|h4|h5|h6|section|article)>")
+_HTML_STRIP_RE = re.compile(r"(?is)<!--.*?-->|<(script|style|noscript).*?>.*?</\1>|<[^>]+>")
+
+
 def _extract_html_text(raw_html: str, max_chars: int) -> str:
-    html = re.sub(r"(?is)<!--.*?-->", " ", raw_html)
-    html = re.sub(r"(?is)<(script|style|noscript).*?>.*?</\1>", " ", html)
-    html = re.sub(r"(?i)<br\s*/?>", "\n", html)
-    html = re.sub(r"(?i)</(p|div|li|tr|h1|h2|h3|h4|h5|h6|section|article)>", "\n", html)
-    html = re.sub(r"(?s)<[^>]+>", " ", html)
-    html = unescape(html)
+    html = unescape(_HTML_STRIP_RE.sub(" ", _HTML_LINE_BREAK_RE.sub("\n", raw_html)))
 
     lines: list[str] = []
     for line in html.splitlines():
-        normalized = re.sub(r"\s+", " ", line).strip()
+        normalized = " ".join(line.split())
         if normalized:
             lines.append(normalized)
 
@@ -413,6 +497,19 @@ def _query_looks_specific(query: str) -> bool:
     return bool(ascii_tokens or len(cjk_chars) >= 2)
 
 
+_SCRIPT_PUNCT_CHARS = "{}[]();=<>/\\*"
+_ASCII_LETTER_BYTES = b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _count_alpha(sample: str) -> int:
+    # Minified JS is almost always ASCII, where deleting the letters via bytes.translate counts
+    # them in C; other text keeps the exact Unicode str.isalpha count.
+    if sample.isascii():
+        raw = sample.encode("ascii")
+        return len(raw) - len(raw.translate(None, _ASCII_LETTER_BYTES))
+    return sum(map(str.isalpha, sample))
+
+
 def _looks_like_script_payload(text: str) -> bool:
     sample = (text or "")[:6000].lower()
     if not sample:
@@ -431,9 +528,9 @@ def _looks_like_script_payload(text: str) -> bool:
         "=>",
     ]
     hits = sum(1 for m in markers if m in sample)
-    longest_line = max((len(line) for line in sample.splitlines()), default=0)
-    punct = sum(ch in "{}[]();=<>/\\*" for ch in sample)
-    alpha = sum(ch.isalpha() for ch in sample) or 1
+    longest_line = max(map(len, sample.splitlines()), default=0)
+    punct = sum(map(sample.count, _SCRIPT_PUNCT_CHARS))
+    alpha = _count_alpha(sample) or 1
     punct_ratio = punct / alpha
 
     return (hits >= 3 and longest_line >= 220) or punct_ratio >= 0.45
@@ -695,9 +792,11 @@ def _extract_google_news_rss_results(raw_xml: str, max_results: int) -> list[dic
     return out
 
 
+@lru_cache(maxsize=256)
 def _normalize_url_for_request(raw_url: str) -> str:
     """
     Make URL safe for urllib by encoding non-ASCII host/path/query.
+    Pure function of the input, so retries and repeat fetches reuse the result.
     """
     url = (raw_url or "").strip()
     parsed = urllib.parse.urlsplit(url)
@@ -1028,6 +1127,8 @@ class LocalToolExecutor:
         self._web_cache_lock = threading.Lock()
         self._web_cache_dir = (config.workspace_root / "app" / "data" / "web_cache").resolve()
         self._web_cache_dir.mkdir(parents=True, exist_ok=True)
+        self._web_ssl_contexts: dict[bool, ssl.SSLContext] = {}
+        self._web_openers: dict[int, urllib.request.OpenerDirector] = {}
         self._docker_sandbox = DockerSandboxManager(
             workspace_root=config.workspace_root,
             allowed_roots=config.allowed_roots,
@@ -1064,6 +1165,28 @@ class LocalToolExecutor:
     def _current_session_id(self) -> str:
         return str(getattr(self._runtime_ctx, "session_id", "") or "__anon__")
 
+    def _web_ssl_context(self, *, verify: bool = True) -> ssl.SSLContext:
+        # Loading the CA store costs several ms; web tools share one context per verify mode.
+        verify = verify and not self.config.web_skip_tls_verify
+        context = self._web_ssl_contexts.get(verify)
+        if context is None:
+            if not verify:
+                context = ssl._create_unverified_context()
+            elif self.config.web_ca_cert_path:
+                context = ssl.create_default_context(cafile=self.config.web_ca_cert_path)
+            else:
+                context = ssl.create_default_context()
+            self._web_ssl_contexts[verify] = context
+        return context
+
+    def _web_opener(self, context: ssl.SSLContext | None) -> urllib.request.OpenerDirector:
+        key = id(context)
+        opener = self._web_openers.get(key)
+        if opener is None:
+            opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=context))
+            self._web_openers[key] = opener
+        return opener
+
     def _web_cache_path(self, prefix: str, payload: dict[str, Any]) -> Path:
         raw = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
         digest = hashlib.sha256(raw).hexdigest()
@@ -1581,20 +1704,16 @@ class LocalToolExecutor:
                     timeout_sec=timeout_val,
                     container_cwd=sandbox_cwd,
                 )
+                returncode = proc.returncode
+                stdout = _truncate_output(proc.stdout)
+                stderr = _truncate_output(proc.stderr)
             else:
-                proc = subprocess.run(
-                    argv,
-                    cwd=str(real_cwd),
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout_val,
-                    check=False,
-                )
+                returncode, stdout, stderr = _run_host_command(argv, real_cwd, timeout_val)
             payload: dict[str, Any] = {
-                "ok": proc.returncode == 0,
-                "returncode": proc.returncode,
-                "stdout": _truncate_output(proc.stdout),
-                "stderr": _truncate_output(proc.stderr),
+                "ok": returncode == 0,
+                "returncode": returncode,
+                "stdout": stdout,
+                "stderr": stderr,
                 "cwd": str(real_cwd),
                 "host_cwd": str(real_cwd),
                 "command": " ".join(shlex.quote(x) for x in argv),
@@ -1621,17 +1740,22 @@ class LocalToolExecutor:
             if not real_path.is_dir():
                 return {"ok": False, "error": f"Not a directory: {path}"}
 
-            entries = []
-            for child in sorted(real_path.iterdir(), key=lambda p: (not p.is_dir(), p.name.lower())):
-                entries.append(
-                    {
-                        "name": child.name,
-                        "is_dir": child.is_dir(),
-                        "size": child.stat().st_size if child.is_file() else None,
-                    }
+            # DirEntry caches the readdir type and the stat result, so each child costs at most one
+            # stat; only the first max_entries in listing order are selected and formatted.
+            with os.scandir(real_path) as scan:
+                children = heapq.nsmallest(
+                    max(1, max_entries),
+                    scan,
+                    key=lambda entry: (not entry.is_dir(), entry.name.lower()),
                 )
-                if len(entries) >= max_entries:
-                    break
+            entries = [
+                {
+                    "name": child.name,
+                    "is_dir": child.is_dir(),
+                    "size": child.stat().st_size if child.is_file() else None,
+                }
+                for child in children
+            ]
             return {"ok": True, "path": str(real_path), "entries": entries}
         except Exception as exc:
             return {"ok": False, "error": f"list_directory failed: {exc}"}
@@ -2965,18 +3089,13 @@ class LocalToolExecutor:
         search_url = "https://duckduckgo.com/html/?q=" + urllib.parse.quote_plus(q)
         lite_url = "https://lite.duckduckgo.com/lite/?q=" + urllib.parse.quote_plus(q)
 
-        if self.config.web_skip_tls_verify:
-            ssl_context = ssl._create_unverified_context()
-        elif self.config.web_ca_cert_path:
-            try:
-                ssl_context = ssl.create_default_context(cafile=self.config.web_ca_cert_path)
-            except Exception as exc:
-                return {
-                    "ok": False,
-                    "error": f"Invalid web CA cert path: {self.config.web_ca_cert_path} ({exc})",
-                }
-        else:
-            ssl_context = ssl.create_default_context()
+        try:
+            ssl_context = self._web_ssl_context()
+        except Exception as exc:
+            return {
+                "ok": False,
+                "error": f"Invalid web CA cert path: {self.config.web_ca_cert_path} ({exc})",
+            }
 
         headers = {
             "User-Agent": (
@@ -2999,8 +3118,7 @@ class LocalToolExecutor:
                 headers=headers,
                 method="GET",
             )
-            opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=current_context))
-            return opener.open(req, timeout=timeout_val)
+            return self._web_opener(current_context).open(req, timeout=timeout_val)
 
         def _fetch_page(target_url: str, current_context: ssl.SSLContext | None) -> tuple[int, str, str, bool]:
             with _open(current_context, target_url) as resp:
@@ -3019,7 +3137,7 @@ class LocalToolExecutor:
             except Exception as first_exc:
                 if not self.config.web_skip_tls_verify and _is_cert_verify_error(first_exc):
                     tls_warning = "TLS verify failed; search_web auto-retried with verify disabled."
-                    active_context = ssl._create_unverified_context()
+                    active_context = self._web_ssl_context(verify=False)
                     return _fetch_page(target_url, active_context)
                 raise
 
@@ -3245,18 +3363,13 @@ class LocalToolExecutor:
 
         ssl_context: ssl.SSLContext | None = None
         if parsed.scheme == "https":
-            if self.config.web_skip_tls_verify:
-                ssl_context = ssl._create_unverified_context()
-            elif self.config.web_ca_cert_path:
-                try:
-                    ssl_context = ssl.create_default_context(cafile=self.config.web_ca_cert_path)
-                except Exception as exc:
-                    return {
-                        "ok": False,
-                        "error": f"Invalid web CA cert path: {self.config.web_ca_cert_path} ({exc})",
-                    }
-            else:
-                ssl_context = ssl.create_default_context()
+            try:
+                ssl_context = self._web_ssl_context()
+            except Exception as exc:
+                return {
+                    "ok": False,
+                    "error": f"Invalid web CA cert path: {self.config.web_ca_cert_path} ({exc})",
+                }
 
         headers = {
             "User-Agent": (
@@ -3278,8 +3391,7 @@ class LocalToolExecutor:
                 headers=headers,
                 method="GET",
             )
-            opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=current_context))
-            return opener.open(req, timeout=timeout_val)
+            return self._web_opener(current_context).open(req, timeout=timeout_val)
 
         try:
             try:
@@ -3287,7 +3399,7 @@ class LocalToolExecutor:
             except Exception as first_exc:
                 if not self.config.web_skip_tls_verify and _is_cert_verify_error(first_exc):
                     tls_warning = "TLS verify failed; download_web_file auto-retried with verify disabled."
-                    resp_cm = _open(ssl._create_unverified_context())
+                    resp_cm = _open(self._web_ssl_context(verify=False))
                 else:
                     raise
 
@@ -3369,18 +3481,13 @@ class LocalToolExecutor:
             return {**cached, "cached": True}
         ssl_context: ssl.SSLContext | None = None
         if parsed.scheme == "https":
-            if self.config.web_skip_tls_verify:
-                ssl_context = ssl._create_unverified_context()
-            elif self.config.web_ca_cert_path:
-                try:
-                    ssl_context = ssl.create_default_context(cafile=self.config.web_ca_cert_path)
-                except Exception as exc:
-                    return {
-                        "ok": False,
-                        "error": f"Invalid web CA cert path: {self.config.web_ca_cert_path} ({exc})",
-                    }
-            else:
-                ssl_context = ssl.create_default_context()
+            try:
+                ssl_context = self._web_ssl_context()
+            except Exception as exc:
+                return {
+                    "ok": False,
+                    "error": f"Invalid web CA cert path: {self.config.web_ca_cert_path} ({exc})",
+                }
 
         default_headers = {
             # Use a browser-like UA to reduce bot-block false positives.
@@ -3403,8 +3510,7 @@ class LocalToolExecutor:
                 headers=default_headers,
                 method="GET",
             )
-            opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=current_context))
-            return opener.open(req, timeout=timeout_val)
+            return self._web_opener(current_context).open(req, timeout=timeout_val)
 
         try:
             try:
@@ -3415,7 +3521,7 @@ class LocalToolExecutor:
                 # retry once with verification off for fetch_web only.
                 if not self.config.web_skip_tls_verify and _is_cert_verify_error(first_exc):
                     tls_warning = "TLS verify failed; fetch_web auto-retried with verify disabled."
-                    resp_cm = _open(ssl._create_unverified_context(), request_url)
+                    resp_cm = _open(self._web_ssl_context(verify=False), request_url)
                 else:
                     raise
 
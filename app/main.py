@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
 import copy
 import json
 import os
@@ -20,6 +21,7 @@ from app.agent import OfficeAgent
 from app.config import load_config
 from app.core.bootstrap import build_kernel_runtime
 from app.core.healthcheck import build_kernel_health_payload
+from app.document_text import set_pdf_worker_count
 from app.evals import run_regression_evals
 from app.evolution import EvolutionStore
 from app.models import (
@@ -197,7 +199,14 @@ def get_agent() -> OfficeAgent:
         _agent = OfficeAgent(config, kernel_runtime=get_kernel_runtime())
     return _agent
 
-app = FastAPI(title=PRODUCT_PROFILE.app_title, version=APP_VERSION)
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    set_pdf_worker_count(config.pdf_workers)
+    get_agent().prewarm_default_runner()
+    yield
+
+app = FastAPI(title=PRODUCT_PROFILE.app_title, version=APP_VERSION, lifespan=_lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,8 +26,9 @@ class OpenAIAPIProviderModule:
         }
         if agent.config.openai_temperature is not None:
             kwargs["temperature"] = agent.config.openai_temperature
-        if agent.config.openai_base_url:
-            kwargs["base_url"] = agent._normalize_base_url(agent.config.openai_base_url)
+        base_url = agent.openai_base_url()
+        if base_url:
+            kwargs["base_url"] = base_url
         if agent.config.openai_ca_cert_path:
             agent._ensure_openai_ca_env(agent.config.openai_ca_cert_path)
         return agent._ChatOpenAI(**kwargs)
@@ -140,6 +140,56 @@ def looks_like_code_generation_request(user_message: str, attachment_metas: list
     return True
 
 
+_ATTACHMENT_DEFERRAL_PATTERNS = (
+    "已完成解析", "已经完成解析", "已经完成了解析", "已解析完成", "已经解析完成", "无需调用工具",
+    "无需再调用工具", "无需再次调用工具", "不需要调用工具", "不必调用工具", "already parsed",
+    "already finished parsing", "no need to call tool", "no need to use tool", "no tools needed",
+)
+_GENERAL_GATE_PATTERNS = (
+    "要不要", "是否继续", "是否要我", "是否直接搜索", "是否直接查", "直接搜索", "直接查", "先直接搜索",
+    "先直接查", "能直接搜索吗", "可以直接搜索吗", "要不要直接搜索", "要不要我直接搜索", "你选", "请选择",
+    "选一个", "选一种", "二选一", "do you want me to continue", "should i continue", "if you agree",
+    "if agreed", "如你同意", "如果同意", "若你同意", "如果你同意", "如您同意", "若您同意", "同意的话",
+    "同意继续", "回复同意继续", '回复“同意继续”', "回复'同意继续'", "授权继续", "是否可直接访问",
+    "是否可以直接访问", "是否能直接访问", "可直接访问的目录", "可访问的目录", "是不是可访问",
+    "请确认我可以读取", "请确认我能读取", "请确认可以读取", "请确认可读取", "请确认我可以访问",
+    "请确认我可以查看", "请确认可访问", "请确认可以访问", "可否读取", "能否读取", "读取下面两个路径",
+    "读取以下两个路径", "读取下列路径", "预览内容不完整", "预览不完整", "内容不完整（截断", "内容不完整(截断",
+    "preview is incomplete", "preview was truncated", "content preview is truncated", "please confirm i can read",
+    "can i read the following", "need to read the full file", "need to read the full document",
+    "is workbench directly accessible", "is it directly accessible", "请提供完整文件名", "请给出完整文件名",
+    "请提供完整的文件名", "请提供扩展名", "请给出扩展名", "需要扩展名", "需要文件扩展名", "需要完整文件名",
+    "带扩展名", "完整文件名", "完整的文件名", "file extension", "with extension", "full filename",
+    "exact filename", "请粘贴原文", "请贴原文", "请把原文贴", "请提供原文", "请先提供原文", "请先提供原文片段",
+    "请先贴原文", "请先把原文贴", "请把代码贴出来", "请贴出完整代码", "请贴出原始代码", "paste the original",
+    "paste the full code", "provide the original text",
+)
+# Tool/attachment turns also match these; dict.fromkeys drops the overlap with the general list.
+_TOOL_GATE_PATTERNS = tuple(
+    dict.fromkeys(
+        (
+            *_GENERAL_GATE_PATTERNS,
+            "两种方案", "可行方案", "方案a", "方案b", "工具未启用", "还没有被激活", "工具接口", "无法触发",
+            "系统不执行写入", "绝对路径", "具体路径", "完整路径", "文件夹路径", "请告诉我", "你可以告诉我", "继续读取吗",
+            "继续读吗", "继续读取其他部分", "继续查看其他部分", "需要继续读取", "需要继续读", "需要读取其他部分",
+            "需要读其他部分", "怕太大", "太大", "文件太大", "内容太大", "最终确认", "确认句", "无需你回答",
+            "不执行写入", "触发工具调用", "必须包含路径", "需要你同意", "需要你的同意", "需要你回复同意继续",
+            "need your confirmation", "do you want me to continue", "should i continue", "please provide instructions",
+            "你当前的指示中没有新增对读取附件内容的要求", "没有新增对读取附件内容的要求", "若后续需要解析",
+            "后续需要解析", "无需调用工具", "无需再调用工具", "无需再次调用工具", "不需要调用工具", "已完成解析",
+            "已经完成了解析", "已解析完成", "write_text_file", "append_text_file", "directly search", "search directly",
+            "absolute path", "full path", "full filename", "exact filename", "file extension", "with extension",
+        )
+    )
+)
+_GATE_FILE_HINTS = (
+    "文件", "读取", "写入", "生成", "保存", "read_text_file", "write_text_file", "append_text_file", "chunk",
+    "附件", "邮件", "文档", "path", "扩展名", "文件名", "解析", "搜索", "函数", "目录", "文件夹",
+)
+_CONFIRM_READ_ZH_RE = re.compile(r"请确认.{0,24}(?:读取|访问|查看).{0,24}(?:路径|文件|附件)")
+_CONFIRM_READ_EN_RE = re.compile(r"confirm.{0,30}(?:read|access|open).{0,30}(?:path|file|attachment)")
+
+
 def looks_like_permission_gate_text(
     text: str,
     *,
@@ -151,57 +201,16 @@ def looks_like_permission_gate_text(
         return False
     if len(lowered) > 5000:
         lowered = lowered[:5000]
-    attachment_deferral_patterns = (
-        "已完成解析", "已经完成解析", "已经完成了解析", "已解析完成", "已经解析完成", "无需调用工具",
-        "无需再调用工具", "无需再次调用工具", "不需要调用工具", "不必调用工具", "already parsed",
-        "already finished parsing", "no need to call tool", "no need to use tool", "no tools needed",
-    )
-    if has_attachments and any(p in lowered for p in attachment_deferral_patterns):
+    if has_attachments and any(p in lowered for p in _ATTACHMENT_DEFERRAL_PATTERNS):
         return True
 
-    general_gate_patterns = (
-        "要不要", "是否继续", "是否要我", "是否直接搜索", "是否直接查", "直接搜索", "直接查", "先直接搜索",
-        "先直接查", "能直接搜索吗", "可以直接搜索吗", "要不要直接搜索", "要不要我直接搜索", "你选", "请选择",
-        "选一个", "选一种", "二选一", "do you want me to continue", "should i continue", "if you agree",
-        "if agreed", "如你同意", "如果同意", "若你同意", "如果你同意", "如您同意", "若您同意", "同意的话",
-        "同意继续", "回复同意继续", '回复“同意继续”', "回复'同意继续'", "授权继续", "是否可直接访问",
-        "是否可以直接访问", "是否能直接访问", "可直接访问的目录", "可访问的目录", "是不是可访问",
-        "请确认我可以读取", "请确认我能读取", "请确认可以读取", "请确认可读取", "请确认我可以访问",
-        "请确认我可以查看", "请确认可访问", "请确认可以访问", "可否读取", "能否读取", "读取下面两个路径",
-        "读取以下两个路径", "读取下列路径", "预览内容不完整", "预览不完整", "内容不完整（截断", "内容不完整(截断",
-        "preview is incomplete", "preview was truncated", "content preview is truncated", "please confirm i can read",
-        "can i read the following", "need to read the full file", "need to read the full document",
-        "is workbench directly accessible", "is it directly accessible", "请提供完整文件名", "请给出完整文件名",
-        "请提供完整的文件名", "请提供扩展名", "请给出扩展名", "需要扩展名", "需要文件扩展名", "需要完整文件名",
-        "带扩展名", "完整文件名", "完整的文件名", "file extension", "with extension", "full filename",
-        "exact filename", "请粘贴原文", "请贴原文", "请把原文贴", "请提供原文", "请先提供原文", "请先提供原文片段",
-        "请先贴原文", "请先把原文贴", "请把代码贴出来", "请贴出完整代码", "请贴出原始代码", "paste the original",
-        "paste the full code", "provide the original text",
-    )
     if not request_requires_tools and not has_attachments:
-        return any(p in lowered for p in general_gate_patterns)
-
-    patterns = (
-        *general_gate_patterns,
-        "两种方案", "可行方案", "方案a", "方案b", "工具未启用", "还没有被激活", "工具接口", "无法触发",
-        "系统不执行写入", "绝对路径", "具体路径", "完整路径", "文件夹路径", "请告诉我", "你可以告诉我", "继续读取吗",
-        "继续读吗", "继续读取其他部分", "继续查看其他部分", "需要继续读取", "需要继续读", "需要读取其他部分",
-        "需要读其他部分", "怕太大", "太大", "文件太大", "内容太大", "最终确认", "确认句", "无需你回答",
-        "不执行写入", "触发工具调用", "必须包含路径", "需要你同意", "需要你的同意", "需要你回复同意继续",
-        "need your confirmation", "do you want me to continue", "should i continue", "please provide instructions",
-        "你当前的指示中没有新增对读取附件内容的要求", "没有新增对读取附件内容的要求", "若后续需要解析",
-        "后续需要解析", "无需调用工具", "无需再调用工具", "无需再次调用工具", "不需要调用工具", "已完成解析",
-        "已经完成了解析", "已解析完成", "write_text_file", "append_text_file", "directly search", "search directly",
-        "absolute path", "full path", "full filename", "exact filename", "file extension", "with extension",
-    )
-    if re.search(r"请确认.{0,24}(?:读取|访问|查看).{0,24}(?:路径|文件|附件)", lowered):
+        return any(p in lowered for p in _GENERAL_GATE_PATTERNS)
+
+    if _CONFIRM_READ_ZH_RE.search(lowered):
         return True
-    if re.search(r"confirm.{0,30}(?:read|access|open).{0,30}(?:path|file|attachment)", lowered):
+    if _CONFIRM_READ_EN_RE.search(lowered):
         return True
-    if not any(p in lowered for p in patterns):
+    if not any(p in lowered for p in _TOOL_GATE_PATTERNS):
         return False
-    file_hints = (
-        "文件", "读取", "写入", "生成", "保存", "read_text_file", "write_text_file", "append_text_file", "chunk",
-        "附件", "邮件", "文档", "path", "扩展名", "文件名", "解析", "搜索", "函数", "目录", "文件夹",
-    )
-    return any(h in lowered for h in file_hints)
+    return any(h in lowered for h in _GATE_FILE_HINTS)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import re
 import threading
@@ -176,7 +177,8 @@ class UploadStore:
         target_path = (self.uploads_dir / stored_name).resolve()
 
         content = await upload.read()
-        target_path.write_bytes(content)
+        # Uploads can be tens of MB; write off the event loop so other requests keep being served.
+        await asyncio.to_thread(target_path.write_bytes, content)
 
         mime = upload.content_type or "application/octet-stream"
         suffix = Path(original_name).suffix.lower()
@@ -4,6 +4,7 @@ import json
 from pathlib import Path
 from typing import Any
 
+from app.json_codec import dumps_json
 from app.models import ToolEvent
 
 
@@ -266,7 +267,7 @@ def prepare_tool_result_for_llm(
     raw_result: Any,
     raw_json: str,
 ) -> tuple[str, str | None]:
-    text = str(raw_json or "")
+    text = raw_json if isinstance(raw_json, str) else str(raw_json or "")
     length = len(text)
     soft = max(2000, int(agent.config.tool_result_soft_trim_chars))
     hard = max(soft + 1, int(agent.config.tool_result_hard_clear_chars))
@@ -288,9 +289,10 @@ def prepare_tool_result_for_llm(
             "note": "Tool result was too large and hard-pruned for context safety.",
         }
         return (
-            json.dumps(compact_payload, ensure_ascii=False),
+            dumps_json(compact_payload),
             f"工具结果过大({length} chars)，已做硬裁剪后再喂给模型。",
         )
 
-    trimmed = f"{text[:head]}\n...[tool_result_trimmed {length} chars]...\n{text[-tail:]}"
+    # One join sizes the result buffer once; the head/tail slices are the only other copies.
+    trimmed = "".join((text[:head], f"\n...[tool_result_trimmed {length} chars]...\n", text[-tail:]))
     return trimmed, f"工具结果较大({length} chars)，已做软裁剪后继续推理。"